@@ -0,0 +1,43 @@
+"""add encoding and scale to memory_embedding
+
+Revision ID: 3c9a5e7d2b14
+Revises: f0af7e340fb1
+Create Date: 2026-03-02 11:05:41.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9a5e7d2b14'
+down_revision: Union[str, Sequence[str], None] = 'f0af7e340fb1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows are raw float32, which is what the server default records.
+    # Converting them to f16/i8 is a data step: `molly memory requantize`.
+    op.add_column(
+        'memory_embedding',
+        sa.Column('encoding', sa.String(length=8), server_default='f32', nullable=False),
+    )
+    op.add_column('memory_embedding', sa.Column('scale', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Older code only reads float32 BLOBs.
+    compact = op.get_bind().execute(
+        sa.text("SELECT COUNT(*) FROM memory_embedding WHERE encoding <> 'f32'")
+    ).scalar()
+    if compact:
+        raise RuntimeError(
+            f"{compact} embeddings are not f32; run `molly memory requantize --format f32` first"
+        )
+    op.drop_column('memory_embedding', 'scale')
+    op.drop_column('memory_embedding', 'encoding')
@@ -0,0 +1,35 @@
+"""add hot-path indexes to message and memory_item
+
+Revision ID: 5e7c9a1b3d48
+Revises: 8b2d4f6a1c37
+Create Date: 2026-03-05 14:22:09.813364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7c9a1b3d48'
+down_revision: Union[str, Sequence[str], None] = '8b2d4f6a1c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tail / history / keyset pages: WHERE conversation_id = ? ORDER BY id.
+    # InnoDB drops the implicit FK index on conversation_id once this exists.
+    op.create_index('ix_message_conversation_id_id', 'message', ['conversation_id', 'id'])
+    # Salience-filtered memory loads: WHERE salience >= ? (id for the join).
+    op.create_index('ix_memory_item_salience_id', 'memory_item', ['salience', 'id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_memory_item_salience_id', table_name='memory_item')
+    # The FK on message.conversation_id needs some index: put a plain one back first.
+    op.create_index('ix_message_conversation_id', 'message', ['conversation_id'])
+    op.drop_index('ix_message_conversation_id_id', table_name='message')
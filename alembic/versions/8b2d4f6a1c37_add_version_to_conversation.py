@@ -0,0 +1,32 @@
+"""add version to conversation
+
+Revision ID: 8b2d4f6a1c37
+Revises: 3c9a5e7d2b14
+Create Date: 2026-03-04 09:12:27.540118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2d4f6a1c37'
+down_revision: Union[str, Sequence[str], None] = '3c9a5e7d2b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Bumped on every message insert; in-process tail caches compare against it.
+    op.add_column(
+        'conversation',
+        sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('conversation', 'version')
@@ -0,0 +1,28 @@
+"""add archived_at to memory_item
+
+Revision ID: 9d4a2c7e1f05
+Revises: 5e7c9a1b3d48
+Create Date: 2026-03-09 10:41:27.502118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4a2c7e1f05'
+down_revision: Union[str, Sequence[str], None] = '5e7c9a1b3d48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('memory_item', sa.Column('archived_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('memory_item', 'archived_at')
@@ -1,8 +1,14 @@
 from __future__ import annotations
 
+import json
+from collections.abc import AsyncIterator
 from dataclasses import dataclass
 from typing import Protocol
 
+import httpx
+
+from molly.config import Settings
+
 
 @dataclass(frozen=True)
 class ChatMessage:
@@ -10,49 +16,110 @@ class ChatMessage:
     content: str
 
 
-class ModelAdapter(Protocol):
+class AsyncModelAdapter(Protocol):
+    """
+    Model backend for the chat engine (molly.engine): many conversations can
+    wait on the model concurrently in one event loop.
+    """
+
     name: str
 
-    def generate(self, messages: list[ChatMessage]) -> str:
+    async def generate(self, messages: list[ChatMessage]) -> str:
         """Return the assistant's next message."""
         ...
 
-import httpx
-from molly.config import Settings
+    def generate_stream(self, messages: list[ChatMessage]) -> AsyncIterator[str]:
+        """Yield the assistant's next message as text deltas, as they arrive."""
+        ...
+
+    async def aclose(self) -> None:
+        """Release connections/resources held by the adapter."""
+        ...
 
-class LMStudioAdapter:
+
+class AsyncLMStudioAdapter:
     name = "lmstudio"
 
     def __init__(self, settings: Settings):
         self.settings = settings
+        self.client = httpx.AsyncClient(**self._client_kwargs())
+
+    def _client_kwargs(self) -> dict:
+        cfg = self.settings.lmstudio
+        return dict(
+            base_url=cfg.base_url,
+            headers=self._headers(),
+            timeout=httpx.Timeout(cfg.read_timeout, connect=cfg.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=cfg.max_connections,
+                max_keepalive_connections=cfg.max_keepalive,
+                keepalive_expiry=cfg.keepalive_expiry,
+            ),
+        )
 
-    def generate(self, messages: list[ChatMessage]) -> str:
-        payload = {
+    def _payload(self, messages: list[ChatMessage], stream: bool = False) -> dict:
+        return {
             "model": self.settings.lmstudio.model,
             "messages": [{"role": m.role, "content": m.content} for m in messages],
             "temperature": self.settings.lmstudio.temperature,
             "max_tokens": self.settings.lmstudio.max_tokens,
+            "stream": stream,
         }
 
-        headers = {
+    def _headers(self) -> dict[str, str]:
+        return {
             "Authorization": f"Bearer {self.settings.lmstudio.api_key}",
             "Content-Type": "application/json",
         }
 
-        url = f"{self.settings.lmstudio.base_url}/chat/completions"
+    @staticmethod
+    def _sse_delta(line: str) -> str | None:
+        """
+        Server-sent events: one "data: {json}" line per chunk, "data: [DONE]" at
+        the end. Returns the chunk's text ("" for none), or None at [DONE].
+        """
+        if not line.startswith("data:"):
+            return ""
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        choices = json.loads(data).get("choices") or []
+        return ((choices[0].get("delta") or {}).get("content") or "") if choices else ""
 
-        with httpx.Client(timeout=60) as client:
-            r = client.post(url, json=payload, headers=headers)
-            r.raise_for_status()
-            data = r.json()
+    async def generate(self, messages: list[ChatMessage]) -> str:
+        r = await self.client.post("/chat/completions", json=self._payload(messages))
+        r.raise_for_status()
+        data = r.json()
 
         return data["choices"][0]["message"]["content"].strip()
-    
-    
-class DummyAdapter:
+
+    async def generate_stream(self, messages: list[ChatMessage]) -> AsyncIterator[str]:
+        async with self.client.stream("POST", "/chat/completions", json=self._payload(messages, stream=True)) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                delta = self._sse_delta(line)
+                if delta is None:
+                    break
+                if delta:
+                    yield delta
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class AsyncDummyAdapter:
     name = "dummy"
 
-    def generate(self, messages: list[ChatMessage]) -> str:
+    async def generate(self, messages: list[ChatMessage]) -> str:
         # Respond to the most recent user message
         last_user = next((m.content for m in reversed(messages) if m.role == "user"), "")
-        return f"Acknowledged: {last_user}"
\ No newline at end of file
+        return f"Acknowledged: {last_user}"
+
+    async def generate_stream(self, messages: list[ChatMessage]) -> AsyncIterator[str]:
+        # Word-by-word, so the streaming path can be exercised offline.
+        words = (await self.generate(messages)).split(" ")
+        for i, word in enumerate(words):
+            yield word if i == 0 else f" {word}"
+
+    async def aclose(self) -> None:
+        pass
@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from molly.memory_index import decode_embedding_rows, embedding_rows_stmt
+from molly.models import MemoryEmbedding
+
+
+def train_kmeans(
+    vectors: np.ndarray,
+    nlist: int,
+    iters: int = 20,
+    seed: int = 0,
+    batch_size: int = 8192,
+) -> np.ndarray:
+    """
+    Spherical k-means (cosine) over normalized vectors. Returns (nlist, dim) centroids.
+    """
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    nlist = max(1, min(int(nlist), n))
+    centroids = vectors[rng.choice(n, size=nlist, replace=False)].astype(np.float32, copy=True)
+
+    for _ in range(iters):
+        assign = assign_lists(vectors, centroids, batch_size=batch_size)
+        counts = np.bincount(assign, minlength=nlist)
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[counts > 0]
+        sums = np.zeros_like(centroids)
+        sums[counts > 0] = np.add.reduceat(vectors[order], starts, axis=0)
+
+        empty = counts == 0
+        if empty.any():
+            # Re-seed dead centroids from random points instead of letting them drift.
+            sums[empty] = vectors[rng.choice(n, size=int(empty.sum()), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    out = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], batch_size):
+        block = vectors[start : start + batch_size]
+        out[start : start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+class _InvertedList:
+    """
+    Growable (ids, vectors, salience) arrays for one coarse cell.
+    """
+
+    def __init__(self, dim: int):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.salience = np.empty(0, dtype=np.float32)
+        self.n = 0
+
+    def extend(self, ids: np.ndarray, vectors: np.ndarray, salience: np.ndarray) -> None:
+        m = ids.shape[0]
+        need = self.n + m
+        if need > self.ids.shape[0]:
+            cap = max(need, self.ids.shape[0] * 2, 16)
+            for attr in ("ids", "vectors", "salience"):
+                old = getattr(self, attr)
+                new = np.empty((cap,) + old.shape[1:], dtype=old.dtype)
+                new[: self.n] = old[: self.n]
+                setattr(self, attr, new)
+        self.ids[self.n : need] = ids
+        self.vectors[self.n : need] = vectors
+        self.salience[self.n : need] = salience
+        self.n = need
+
+    def remove(self, ids: np.ndarray) -> int:
+        hit = np.isin(self.ids[: self.n], ids)
+        if not hit.any():
+            return 0
+        keep = np.flatnonzero(~hit)
+        m = keep.shape[0]
+        self.ids[:m] = self.ids[keep]
+        self.vectors[:m] = self.vectors[keep]
+        self.salience[:m] = self.salience[keep]
+        self.n = m
+        return int(hit.sum())
+
+
+class IvfIndex:
+    """
+    Embedded approximate nearest neighbour index (IVF-Flat) for nodes without Qdrant.
+
+    A k-means coarse quantizer splits memories into `nlist` cells; a query only
+    scores the rows in its `nprobe` closest cells, so search cost is roughly
+    n * nprobe / nlist instead of n. Until enough rows exist to train
+    (train_min_rows), everything lives in one cell and search is exact.
+
+    Persisted as a single .npz (centroids + rows + watermark); refresh() then
+    only reads memory_embedding rows above the saved watermark, and add()
+    drops new rows into their nearest cell without retraining.
+    """
+
+    name = "ivf"
+
+    def __init__(
+        self,
+        nlist: int = 256,
+        nprobe: int = 8,
+        path: str = "",
+        train_min_rows: int | None = None,
+    ):
+        self.nlist = int(nlist)
+        self.nprobe = int(nprobe)
+        self.path = path
+        self.train_min_rows = int(train_min_rows if train_min_rows is not None else self.nlist * 16)
+
+        self._lock = threading.RLock()
+        self.centroids: np.ndarray | None = None
+        self._lists: list[_InvertedList] = []
+        self._known: set[int] = set()
+        self.watermark = 0
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    # ---- rows ----
+
+    def _all_rows(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        lists = [lst for lst in self._lists if lst.n]
+        if not lists:
+            return (
+                np.empty(0, dtype=np.int64),
+                np.empty((0, 0), dtype=np.float32),
+                np.empty(0, dtype=np.float32),
+            )
+        return (
+            np.concatenate([lst.ids[: lst.n] for lst in lists]),
+            np.concatenate([lst.vectors[: lst.n] for lst in lists]),
+            np.concatenate([lst.salience[: lst.n] for lst in lists]),
+        )
+
+    def _place(self, ids: np.ndarray, vectors: np.ndarray, salience: np.ndarray) -> None:
+        dim = vectors.shape[1]
+        if self.centroids is None:
+            if not self._lists:
+                self._lists = [_InvertedList(dim)]
+            self._lists[0].extend(ids, vectors, salience)
+            return
+
+        assign = assign_lists(vectors, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.flatnonzero(np.diff(assign[order])) + 1
+        for chunk in np.split(order, bounds):
+            cell = int(assign[chunk[0]])
+            self._lists[cell].extend(ids[chunk], vectors[chunk], salience[chunk])
+
+    def add_many(self, ids: np.ndarray, vectors: np.ndarray, salience: np.ndarray) -> int:
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        salience = np.asarray(salience, dtype=np.float32)
+
+        with self._lock:
+            fresh = np.array([int(x) not in self._known for x in ids], dtype=bool)
+            if not fresh.any():
+                return 0
+            ids, vectors, salience = ids[fresh], vectors[fresh], salience[fresh]
+
+            self._place(ids, vectors, salience)
+            self._known.update(int(x) for x in ids)
+
+            if self.centroids is None and len(self._known) >= self.train_min_rows:
+                self.train()
+            return int(ids.shape[0])
+
+    def add(self, item_id: int, vector: np.ndarray, salience: float) -> bool:
+        return (
+            self.add_many(
+                np.array([item_id], dtype=np.int64),
+                np.asarray(vector, dtype=np.float32).reshape(1, -1),
+                np.array([salience], dtype=np.float32),
+            )
+            == 1
+        )
+
+    def train(self, iters: int = 20, sample_size: int | None = None, seed: int = 0) -> None:
+        """
+        (Re)train the coarse quantizer on the rows held and rebuild the lists.
+        """
+        with self._lock:
+            ids, vectors, salience = self._all_rows()
+            if ids.shape[0] == 0:
+                return
+
+            sample_size = sample_size or self.nlist * 256
+            rng = np.random.default_rng(seed)
+            sample = vectors
+            if vectors.shape[0] > sample_size:
+                sample = vectors[rng.choice(vectors.shape[0], size=sample_size, replace=False)]
+
+            self.centroids = train_kmeans(sample, self.nlist, iters=iters, seed=seed)
+            self._lists = [_InvertedList(vectors.shape[1]) for _ in range(self.centroids.shape[0])]
+            self._place(ids, vectors, salience)
+
+    # ---- sync with the DB ----
+
+    def refresh(self, session: Session) -> int:
+        with self._lock:
+            rows = session.execute(
+                embedding_rows_stmt()
+                .where(MemoryEmbedding.id > self.watermark)
+                .order_by(MemoryEmbedding.id.asc())
+            ).all()
+            if not rows:
+                return 0
+
+            added = self.add_many(*decode_embedding_rows(rows))
+            self.watermark = max(self.watermark, int(rows[-1][0]))
+            return added
+
+    def remove(self, ids) -> int:
+        """
+        Drop rows for these memory_item ids (archived by compaction); save()
+        to persist. Returns rows removed.
+        """
+        drop = np.asarray(list(ids), dtype=np.int64)
+        with self._lock:
+            removed = sum(lst.remove(drop) for lst in self._lists) if drop.shape[0] else 0
+            self._known.difference_update(int(x) for x in drop)
+            return removed
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.centroids = None
+            self._lists = []
+            self._known = set()
+            self.watermark = 0
+
+    # ---- persistence ----
+
+    def save(self, path: str | None = None) -> str:
+        path = path or self.path
+        if not path:
+            raise ValueError("No IVF index path configured")
+
+        with self._lock:
+            ids, vectors, salience = self._all_rows()
+            centroids = self.centroids if self.centroids is not None else np.empty((0, vectors.shape[1]))
+            tmp = f"{path}.tmp.npz"
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            np.savez(
+                tmp,
+                centroids=centroids.astype(np.float32),
+                ids=ids,
+                vectors=vectors,
+                salience=salience,
+                watermark=np.array(self.watermark, dtype=np.int64),
+                nlist=np.array(self.nlist, dtype=np.int64),
+            )
+            os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str, nprobe: int = 8) -> IvfIndex | None:
+        if not path or not os.path.exists(path):
+            return None
+
+        with np.load(path) as data:
+            index = cls(nlist=int(data["nlist"]), nprobe=nprobe, path=path)
+            centroids = data["centroids"]
+            if centroids.shape[0]:
+                index.centroids = centroids
+                index._lists = [_InvertedList(centroids.shape[1]) for _ in range(centroids.shape[0])]
+            ids = data["ids"]
+            if ids.shape[0]:
+                index._place(ids, data["vectors"], data["salience"])
+                index._known = {int(x) for x in ids}
+            index.watermark = int(data["watermark"])
+        return index
+
+    # ---- search ----
+
+    def search(
+        self,
+        query_vec: np.ndarray,
+        top_k: int = 5,
+        min_salience: float = 0.0,
+        nprobe: int | None = None,
+    ) -> list[tuple[int, float]]:
+        q = np.asarray(query_vec, dtype=np.float32)
+        with self._lock:
+            if self.centroids is None:
+                probes = [0] if self._lists else []
+            else:
+                cell_scores = self.centroids @ q
+                p = min(int(nprobe or self.nprobe), cell_scores.shape[0])
+                probes = np.argpartition(-cell_scores, p - 1)[:p].tolist()
+
+            lists = [self._lists[c] for c in probes if self._lists[c].n]
+            if not lists or int(top_k) <= 0:
+                return []
+
+            ids = np.concatenate([lst.ids[: lst.n] for lst in lists])
+            scores = np.concatenate([lst.vectors[: lst.n] @ q for lst in lists])
+            if min_salience > 0.0:
+                sal = np.concatenate([lst.salience[: lst.n] for lst in lists])
+                scores = np.where(sal >= min_salience, scores, -np.inf)
+
+        n = scores.shape[0]
+        k = min(int(top_k), n)
+        top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+@dataclass(frozen=True)
+class RecallReport:
+    nprobe: int
+    k: int
+    queries: int
+    recall: float
+    exact_ms: float  # mean per query
+    ann_ms: float  # mean per query
+
+
+def recall_report(
+    index: IvfIndex,
+    k: int = 10,
+    queries: int = 200,
+    nprobes: list[int] | None = None,
+    seed: int = 0,
+) -> list[RecallReport]:
+    """
+    recall@k of the IVF search against exact brute force, using stored vectors
+    as queries (each query's own row is part of both result sets).
+    """
+    ids, vectors, _ = index._all_rows()
+    if ids.shape[0] == 0:
+        return []
+
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(ids.shape[0], size=min(queries, ids.shape[0]), replace=False)
+    kk = min(k, ids.shape[0])
+
+    t0 = time.perf_counter()
+    exact: list[set[int]] = []
+    for i in picks:
+        scores = vectors @ vectors[i]
+        top = np.argpartition(-scores, kk - 1)[:kk] if kk < scores.shape[0] else np.arange(scores.shape[0])
+        exact.append({int(x) for x in ids[top]})
+    exact_ms = (time.perf_counter() - t0) * 1000 / len(picks)
+
+    reports: list[RecallReport] = []
+    for nprobe in nprobes or [index.nprobe]:
+        hit = 0
+        t0 = time.perf_counter()
+        for i, truth in zip(picks, exact):
+            got = {item_id for item_id, _ in index.search(vectors[i], top_k=kk, nprobe=nprobe)}
+            hit += len(got & truth)
+        ann_ms = (time.perf_counter() - t0) * 1000 / len(picks)
+        reports.append(
+            RecallReport(
+                nprobe=nprobe,
+                k=kk,
+                queries=len(picks),
+                recall=hit / (kk * len(picks)),
+                exact_ms=exact_ms,
+                ann_ms=ann_ms,
+            )
+        )
+    return reports
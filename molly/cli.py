@@ -2,9 +2,13 @@ from __future__ import annotations
 
 import argparse
 import logging
+import time
+from collections.abc import Iterator
+
+from sqlalchemy.orm import Session, sessionmaker
 
 from molly.config import load_settings
-from molly.db import DbConnInfo, create_db_engine, ping_db
+from molly.db import DbConnInfo, create_db_engine, ping_db, pool_stats
 from molly.log import setup_logging
 from molly.session import make_session_factory, session_scope
 from molly.repos import AppMetaRepo, ConversationRepo, MessageRepo, MemoryRepo
@@ -17,19 +21,21 @@ def run_doctor() -> int:
 
     log.info("Doctor check: starting")
 
-    cfg = DbConnInfo(
-        host=settings.db.host,
-        port=settings.db.port,
-        name=settings.db.name,
-        user=settings.db.user,
-        password=settings.db.password,
-    )
+    cfg = DbConnInfo.from_settings(settings.db)
 
     try:
         engine = create_db_engine(cfg)
         ping_db(engine)
+        ping_db(engine)  # second checkout should reuse the pooled connection
         log.info("DB: OK (connected and ran SELECT 1)")
         print("Doctor: DB OK ✅")
+
+        db = settings.db
+        print(
+            f"Pool: size={db.pool_size} max_overflow={db.max_overflow} timeout={db.pool_timeout}s "
+            f"recycle={db.pool_recycle}s pre_ping={db.pre_ping} autocommit_reads={db.autocommit_reads}"
+        )
+        print("Pool stats: " + " ".join(f"{k}={v}" for k, v in pool_stats(engine).items()))
         return 0
     except Exception as e:
         log.exception("DB: FAILED")
@@ -37,6 +43,44 @@ def run_doctor() -> int:
         return 2
 
 
+def run_serve(host: str | None = None, port: int | None = None) -> int:
+    import asyncio
+    from dataclasses import replace
+
+    from molly.server import serve
+
+    settings = load_settings()
+    setup_logging(settings.log_level)
+    if host or port:
+        settings = replace(
+            settings,
+            server=replace(settings.server, host=host or settings.server.host, port=port or settings.server.port),
+        )
+
+    if settings.memory.embed_warmup:
+        from molly.embeddings import warm_model_async
+
+        warm_model_async()
+
+    try:
+        asyncio.run(serve(settings))
+    except KeyboardInterrupt:
+        logging.getLogger("molly.server").info("Server stopped")
+    return 0
+
+
+def _paged_conversation_ids(sf: sessionmaker[Session], batch_size: int) -> Iterator[str]:
+    # Conversation ids a keyset page at a time, each page in its own transaction.
+    last_id = ""
+    while True:
+        with session_scope(sf) as s:
+            ids = ConversationRepo(s).ids_after(last_id, batch_size)
+        if not ids:
+            return
+        yield from ids
+        last_id = ids[-1]
+
+
 def main(argv: list[str] | None = None) -> int:
     parser = argparse.ArgumentParser(prog="molly")
     sub = parser.add_subparsers(dest="cmd", required=True)
@@ -48,6 +92,11 @@ def main(argv: list[str] | None = None) -> int:
     chat = sub.add_parser("chat", help="Interactive console chat (persists to DB)")
     chat.add_argument("conversation_id", nargs="?", default=None)
 
+    # ---- serve ----
+    serve = sub.add_parser("serve", help="HTTP chat server (many conversations, shared engine)")
+    serve.add_argument("--host", default=None, help="Defaults to MOLLY_SERVER_HOST")
+    serve.add_argument("--port", type=int, default=None, help="Defaults to MOLLY_SERVER_PORT")
+
     # ---- db command group ----
     db = sub.add_parser("db", help="Database commands")
     db_sub = db.add_subparsers(dest="db_cmd", required=True)
@@ -55,6 +104,8 @@ def main(argv: list[str] | None = None) -> int:
     db_sub.add_parser("upgrade", help="Apply migrations (upgrade to head)")
     db_sub.add_parser("seed", help="Seed basic app metadata")
     db_sub.add_parser("show", help="Show basic app metadata")
+    db_explain = db_sub.add_parser("explain", help="EXPLAIN the hot queries; flag full scans and filesorts")
+    db_explain.add_argument("--sql", action="store_true", help="Also print each statement")
 
     # ---- memory command group ----
     mem = sub.add_parser("memory", help="Memory commands")
@@ -70,6 +121,11 @@ def main(argv: list[str] | None = None) -> int:
     show_mem = mem_sub.add_parser("show", help="Show messages for a conversation")
     show_mem.add_argument("conversation_id")
 
+    export = mem_sub.add_parser("export", help="Stream conversations to JSONL (constant memory)")
+    export.add_argument("conversation_ids", nargs="*", help="Defaults to every conversation")
+    export.add_argument("--out", default="-", help="Output file; '-' = stdout")
+    export.add_argument("--batch-size", type=int, default=1000, help="Rows per keyset page")
+
     remember = mem_sub.add_parser("remember", help="Add a long-term memory item")
     remember.add_argument("kind")
     remember.add_argument("text")
@@ -78,6 +134,40 @@ def main(argv: list[str] | None = None) -> int:
     msearch = mem_sub.add_parser("search", help="Search long-term memory")
     msearch.add_argument("query")
     msearch.add_argument("--k", type=int, default=5)
+    msearch.add_argument("--min-salience", type=float, default=0.1)
+    msearch.add_argument("--mode", choices=["vector", "hybrid", "prefilter"], default=None, help="Defaults to MOLLY_MEMORY_SEARCH_MODE")
+
+    mimport = mem_sub.add_parser("import", help="Bulk import memories from JSONL or CSV")
+    mimport.add_argument("path")
+    mimport.add_argument("--format", choices=["auto", "jsonl", "csv"], default="auto")
+    mimport.add_argument("--chunk-size", type=int, default=500, help="Rows per transaction")
+    mimport.add_argument("--batch-size", type=int, default=64, help="Texts per embedding forward pass")
+
+    snapshot = mem_sub.add_parser("snapshot", help="Export a memory-mapped embedding snapshot")
+    snapshot.add_argument("--path", default=None, help="Defaults to MOLLY_MEMORY_SNAPSHOT_DIR")
+
+    requantize = mem_sub.add_parser("requantize", help="Convert stored embeddings to another format")
+    requantize.add_argument("--format", choices=["f32", "f16", "i8"], default=None, help="Defaults to MOLLY_MEMORY_VECTOR_FORMAT")
+    requantize.add_argument("--batch-size", type=int, default=1000)
+
+    compact = mem_sub.add_parser("compact", help="Decay salience, merge near-duplicates, archive stale memories")
+    compact.add_argument("--half-life-days", type=float, default=30.0, help="Salience halves per this many idle days; 0 = no decay")
+    compact.add_argument("--archive-below", type=float, default=0.05, help="Archive items whose salience falls below this")
+    compact.add_argument("--dedup-threshold", type=float, default=0.95, help="Cosine at which same-kind items merge; 0 = off")
+    compact.add_argument("--block-size", type=int, default=1024, help="Rows per similarity tile")
+    compact.add_argument("--dry-run", action="store_true", help="Report only; roll back")
+
+    ann = mem_sub.add_parser("ann", help="Embedded IVF index commands")
+    ann_sub = ann.add_subparsers(dest="ann_cmd", required=True)
+
+    ann_build = ann_sub.add_parser("build", help="Load all embeddings, train and save the IVF index")
+    ann_build.add_argument("--nlist", type=int, default=None)
+    ann_build.add_argument("--iters", type=int, default=20)
+
+    ann_report = ann_sub.add_parser("report", help="Recall@k of the IVF index vs exact search")
+    ann_report.add_argument("--k", type=int, default=10)
+    ann_report.add_argument("--queries", type=int, default=200)
+    ann_report.add_argument("--nprobe", type=int, nargs="+", default=None)
 
     # ---- prompt command group ----
     prompt = sub.add_parser("prompt", help="System prompt commands")
@@ -103,18 +193,16 @@ def main(argv: list[str] | None = None) -> int:
 
         return run_chat(args.conversation_id)
 
+    # ---- serve ----
+    if args.cmd == "serve":
+        return run_serve(args.host, args.port)
+
     # ---- prompt ----
     if args.cmd == "prompt":
         settings = load_settings()
         setup_logging(settings.log_level)
 
-        cfg = DbConnInfo(
-            host=settings.db.host,
-            port=settings.db.port,
-            name=settings.db.name,
-            user=settings.db.user,
-            password=settings.db.password,
-        )
+        cfg = DbConnInfo.from_settings(settings.db)
         engine = create_db_engine(cfg)
         sf = make_session_factory(engine)
 
@@ -148,13 +236,7 @@ def main(argv: list[str] | None = None) -> int:
             print("DB upgraded to head ✅")
             return 0
 
-        cfg = DbConnInfo(
-            host=settings.db.host,
-            port=settings.db.port,
-            name=settings.db.name,
-            user=settings.db.user,
-            password=settings.db.password,
-        )
+        cfg = DbConnInfo.from_settings(settings.db)
         engine = create_db_engine(cfg)
         sf = make_session_factory(engine)
 
@@ -166,6 +248,26 @@ def main(argv: list[str] | None = None) -> int:
             print("DB seeded ✅")
             return 0
 
+        if args.db_cmd == "explain":
+            from molly.explain import explain_hot_queries
+
+            with session_scope(sf) as s:
+                plans = explain_hot_queries(s)
+
+            flagged = 0
+            for plan in plans:
+                status = "⚠️ " if plan.warnings else "✅"
+                print(f"{status} {plan.name}")
+                if args.sql:
+                    print(f"    {plan.sql}")
+                for row in plan.rows:
+                    print("    " + "  ".join(f"{k}={v}" for k, v in row.items() if v is not None))
+                for w in plan.warnings:
+                    print(f"    -> {w}")
+                flagged += bool(plan.warnings)
+            print(f"{len(plans)} queries, {flagged} flagged")
+            return 0
+
         if args.db_cmd == "show":
             with session_scope(sf) as s:
                 repo = AppMetaRepo(s)
@@ -178,14 +280,16 @@ def main(argv: list[str] | None = None) -> int:
     if args.cmd == "memory":
         settings = load_settings()
         setup_logging(settings.log_level)
+        log = logging.getLogger("molly.memory")
 
-        cfg = DbConnInfo(
-            host=settings.db.host,
-            port=settings.db.port,
-            name=settings.db.name,
-            user=settings.db.user,
-            password=settings.db.password,
-        )
+        # Memory-only imports stay here so other commands start fast.
+        from molly.embeddings import configure_embedding_cache, get_embedding_cache
+        from molly.memory_index import write_snapshot
+        from molly.memory_repo import get_memory_backend, make_memory_repo
+
+        configure_embedding_cache(settings.memory.embed_cache_size, settings.memory.embed_cache_path)
+
+        cfg = DbConnInfo.from_settings(settings.db)
         engine = create_db_engine(cfg)
         sf = make_session_factory(engine)
 
@@ -218,29 +322,202 @@ def main(argv: list[str] | None = None) -> int:
                     print(f"Conversation not found ❌ ({args.conversation_id})")
                     return 2
 
-                msgs = MessageRepo(s).list_for_conversation(args.conversation_id)
+                for m in MessageRepo(s).iter_for_conversation(args.conversation_id):
+                    print(f"[{m.created_at}] {m.role}: {m.content}")
+            return 0
 
-            for m in msgs:
-                print(f"[{m.created_at}] {m.role}: {m.content}")
+        if args.mem_cmd == "export":
+            import json
+            import sys
+
+            out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+            total = 0
+            started = time.perf_counter()
+            try:
+                # Each keyset page reads in its own short transaction, so a long
+                # export never pins a snapshot (or holds undo history) on the server.
+                for convo_id in args.conversation_ids or _paged_conversation_ids(sf, args.batch_size):
+                    if args.conversation_ids:
+                        with session_scope(sf) as s:
+                            found = ConversationRepo(s).get(convo_id) is not None
+                        if not found:
+                            print(f"Conversation not found ❌ ({convo_id})", file=sys.stderr)
+                            return 2
+                    last_id = 0
+                    while True:
+                        with session_scope(sf) as s:
+                            rows = MessageRepo(s).page(convo_id, after_id=last_id, limit=args.batch_size)
+                        if not rows:
+                            break
+                        last_id = rows[-1].id
+                        for m in rows:
+                            out.write(
+                                json.dumps(
+                                    {
+                                        "conversation_id": convo_id,
+                                        "id": m.id,
+                                        "role": m.role,
+                                        "content": m.content,
+                                        "created_at": m.created_at.isoformat() if m.created_at else None,
+                                    },
+                                    ensure_ascii=False,
+                                )
+                                + "\n"
+                            )
+                            total += 1
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+
+            elapsed = time.perf_counter() - started
+            rate = total / elapsed if elapsed > 0 else 0.0
+            print(f"Export done ✅ messages={total} in {elapsed:0.1f}s ({rate:0.1f} rows/s)", file=sys.stderr)
             return 0
 
         if args.mem_cmd == "remember":
             with session_scope(sf) as s:
-                item = MemoryRepo(s).add_memory(
+                repo = make_memory_repo(s, settings)
+                item = repo.add_memory(
                     kind=args.kind,
                     text=args.text,
                     salience=args.salience,
                 )
                 item_id = item.id
+            if repo.deduplicated:
+                print(f"Already remembered ✅ id={item_id} ({settings.memory.dedup_action})")
+                return 0
             print(f"Memory saved ✅ id={item_id}")
             return 0
 
         if args.mem_cmd == "search":
             with session_scope(sf) as s:
-                hits = MemoryRepo(s).search(args.query, top_k=args.k)
+                hits = make_memory_repo(s, settings).search(
+                    args.query,
+                    top_k=args.k,
+                    min_salience=args.min_salience,
+                    mode=args.mode,
+                )
 
             for item, score in hits:
                 print(f"{score:0.3f}  id={item.id}  {item.kind}: {item.text}")
+            log.debug("Embedding cache: %s", get_embedding_cache().stats())
+            return 0
+
+        if args.mem_cmd == "import":
+            from molly.memory_import import chunked, iter_records
+
+            total = 0
+            duplicates = 0
+            started = time.perf_counter()
+            for chunk in chunked(iter_records(args.path, args.format), args.chunk_size):
+                with session_scope(sf) as s:
+                    repo = make_memory_repo(s, settings)
+                    repo.add_memories(chunk, batch_size=args.batch_size)
+                total += len(chunk)
+                duplicates += repo.deduplicated
+                elapsed = time.perf_counter() - started
+                print(f"imported {total} rows ({total / elapsed:0.1f} rows/s)")
+
+            elapsed = time.perf_counter() - started
+            rate = total / elapsed if elapsed > 0 else 0.0
+            dedup = f" duplicates={duplicates} ({settings.memory.dedup_action})" if settings.memory.dedup_threshold > 0 else ""
+            print(f"Import done ✅ rows={total}{dedup} in {elapsed:0.1f}s ({rate:0.1f} rows/s)")
+            return 0
+
+        if args.mem_cmd == "requantize":
+            fmt = args.format or settings.memory.vector_format
+            total = 0
+            last_id = 0
+            while True:
+                with session_scope(sf) as s:
+                    converted, last_id = MemoryRepo(s).requantize(fmt, batch_size=args.batch_size, after_id=last_id)
+                if not converted:
+                    break
+                total += converted
+                print(f"converted {total} rows")
+            print(f"Requantize done ✅ format={fmt} rows={total}")
+            if total and settings.memory.snapshot_dir:
+                print("Re-run `molly memory snapshot` so the snapshot matches.")
+            return 0
+
+        if args.mem_cmd == "compact":
+            from molly.compaction import compact_memories
+
+            started = time.perf_counter()
+            s = sf()
+            try:
+                report = compact_memories(
+                    s,
+                    half_life_days=args.half_life_days,
+                    archive_below=args.archive_below,
+                    dedup_threshold=args.dedup_threshold,
+                    block_size=args.block_size,
+                    storage=settings.memory.vector_format,
+                    backend=None if args.dry_run else get_memory_backend(settings),
+                )
+                if args.dry_run:
+                    s.rollback()
+                else:
+                    s.commit()
+            except Exception:
+                s.rollback()
+                raise
+            finally:
+                s.close()
+
+            print(f"decayed={report.decayed} archived={report.archived} merged={report.merged} (groups={report.groups})")
+            print(
+                f"active memories {report.active_before} -> {report.active_after} "
+                f"(-{report.shrink:0.1%}), index ~{report.bytes_before / 1e6:0.2f}MB -> {report.bytes_after / 1e6:0.2f}MB"
+            )
+            if args.dry_run:
+                print(f"Dry run, nothing written ({time.perf_counter() - started:0.1f}s)")
+                return 0
+            if report.removed and settings.memory.backend == "ivf" and settings.memory.ivf_path:
+                get_memory_backend(settings).save()
+            print(f"Compact done ✅ in {time.perf_counter() - started:0.1f}s (removed {report.removed} from {settings.memory.backend} index)")
+            if report.active_after != report.active_before and settings.memory.snapshot_dir:
+                print("Re-run `molly memory snapshot` so the snapshot matches.")
+            return 0
+
+        if args.mem_cmd == "ann":
+            from molly.ann import IvfIndex, recall_report
+
+            cfg = settings.memory
+            index = IvfIndex.load(cfg.ivf_path, nprobe=cfg.ivf_nprobe)
+            if index is None or (args.ann_cmd == "build" and args.nlist):
+                index = IvfIndex(nlist=args.nlist or cfg.ivf_nlist, nprobe=cfg.ivf_nprobe, path=cfg.ivf_path)
+            with session_scope(sf) as s:
+                index.refresh(s)
+
+            if args.ann_cmd == "build":
+                index.train(iters=args.iters)
+                if cfg.ivf_path:
+                    index.save()
+                    print(f"IVF index saved ✅ {cfg.ivf_path} rows={len(index)} nlist={index.nlist}")
+                else:
+                    print(f"IVF index trained (not saved, MOLLY_IVF_PATH unset) rows={len(index)}")
+                return 0
+
+            if args.ann_cmd == "report":
+                if not index.trained:
+                    index.train()
+                print(f"rows={len(index)} nlist={index.nlist}")
+                for r in recall_report(index, k=args.k, queries=args.queries, nprobes=args.nprobe):
+                    print(
+                        f"nprobe={r.nprobe:<4d} recall@{r.k}={r.recall:0.3f}  "
+                        f"ann={r.ann_ms:0.2f}ms  exact={r.exact_ms:0.2f}ms  (queries={r.queries})"
+                    )
+                return 0
+
+        if args.mem_cmd == "snapshot":
+            path = args.path or settings.memory.snapshot_dir
+            if not path:
+                print("No snapshot path ❌ (pass --path or set MOLLY_MEMORY_SNAPSHOT_DIR)")
+                return 2
+            with session_scope(sf) as s:
+                meta = write_snapshot(s, path, storage=settings.memory.vector_format)
+            print(f"Snapshot written ✅ {path} count={meta['count']} watermark={meta['watermark']}")
             return 0
 
     return 1
\ No newline at end of file
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import case, event, func, literal_column, select, update
+from sqlalchemy.orm import Session
+
+from molly.memory_index import decode_embedding_rows, embedding_rows_stmt
+from molly.memory_repo import MemoryBackend
+from molly.models import MemoryItem
+from molly.repos import AppMetaRepo
+from molly.vector_codec import storage_dtype
+
+DECAY_META_KEY = "memory_decay_at"  # app_meta: when salience decay last ran
+_IN_CHUNK = 1000  # ids per IN (...) list
+
+
+@dataclass
+class CompactionReport:
+    active_before: int = 0
+    active_after: int = 0
+    decayed: int = 0  # rows whose salience was lowered
+    archived: int = 0  # archived for low salience
+    merged: int = 0  # archived as near-duplicates of a kept item
+    groups: int = 0  # near-duplicate groups found
+    removed: int = 0  # rows dropped from the search backend after commit
+    row_bytes: int = 0  # index bytes per row (vector + id + salience + scale)
+
+    @property
+    def bytes_before(self) -> int:
+        return self.active_before * self.row_bytes
+
+    @property
+    def bytes_after(self) -> int:
+        return self.active_after * self.row_bytes
+
+    @property
+    def shrink(self) -> float:
+        return 1.0 - self.active_after / self.active_before if self.active_before else 0.0
+
+
+def _seconds_between(start, end, dialect: str):
+    if dialect == "sqlite":
+        return (func.julianday(end) - func.julianday(start)) * 86400.0
+    return func.timestampdiff(literal_column("SECOND"), start, end)  # MariaDB / MySQL
+
+
+def decay_salience(session: Session, half_life_days: float, now: datetime, since: datetime | None = None) -> int:
+    """
+    Halve salience every `half_life_days` without use, in one UPDATE.
+
+    Each item decays over the time since it was last used (or created), but
+    only from `since` (the previous run) on, so repeated runs compound to the
+    same result as one run over the whole period. Returns rows updated.
+    """
+    if half_life_days <= 0:
+        return 0
+    used = func.coalesce(MemoryItem.last_used_at, MemoryItem.created_at)
+    start = used if since is None else case((used > since, used), else_=since)
+    idle = _seconds_between(start, now, session.get_bind().dialect.name)
+    result = session.execute(
+        update(MemoryItem)
+        .where(MemoryItem.archived_at.is_(None), start < now)
+        .values(salience=MemoryItem.salience * func.pow(0.5, idle / (half_life_days * 86400.0)))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def _archive(session: Session, ids: list[int], now: datetime) -> None:
+    for k in range(0, len(ids), _IN_CHUNK):
+        session.execute(
+            update(MemoryItem)
+            .where(MemoryItem.id.in_(ids[k:k + _IN_CHUNK]))
+            .values(archived_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def low_salience_stmt(below: float):
+    """
+    Ids of active items with salience < `below` (a range scan on
+    ix_memory_item_salience_id).
+    """
+    return select(MemoryItem.id).where(MemoryItem.archived_at.is_(None), MemoryItem.salience < below)
+
+
+def archive_low_salience(session: Session, below: float, now: datetime) -> list[int]:
+    """
+    Archive active items with salience < `below`. Returns their ids.
+    """
+    ids = list(session.scalars(low_salience_stmt(below)))
+    _archive(session, ids, now)
+    return ids
+
+
+def find_near_duplicates(
+    ids: np.ndarray,
+    kinds: np.ndarray,
+    vectors: np.ndarray,
+    threshold: float,
+    block_size: int = 1024,
+) -> list[list[int]]:
+    """
+    Groups (as lists of item ids) of same-kind items linked by cosine >= threshold.
+
+    Similarities are computed tile by tile (block_size x block_size matrix
+    products over the upper triangle), so memory stays at one tile while the
+    pair search runs in BLAS instead of Python loops. Pairs are joined
+    transitively with union-find.
+    """
+    n = ids.shape[0]
+    if n < 2:
+        return []
+    v = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(v, axis=1, keepdims=True)
+    v = v / np.where(norms > 0, norms, 1.0)  # quantized rows are slightly off unit length
+    _, kind_codes = np.unique(kinds, return_inverse=True)
+
+    parent = np.arange(n)
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    b = max(1, int(block_size))
+    for i0 in range(0, n, b):
+        a = v[i0:i0 + b]
+        for j0 in range(i0, n, b):
+            sims = a @ v[j0:j0 + b].T
+            if j0 == i0:
+                sims = np.triu(sims, 1)  # each pair once, no self-matches
+            rows, cols = np.nonzero(sims >= threshold)
+            rows += i0
+            cols += j0
+            same = kind_codes[rows] == kind_codes[cols]
+            for i, j in zip(rows[same].tolist(), cols[same].tolist()):
+                ri, rj = root(i), root(j)
+                if ri != rj:
+                    parent[max(ri, rj)] = min(ri, rj)
+
+    groups: dict[int, list[int]] = {}
+    for i in range(n):
+        groups.setdefault(root(i), []).append(int(ids[i]))
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def merge_duplicates(session: Session, groups: list[list[int]], now: datetime) -> list[int]:
+    """
+    Keep the most salient item of each group (oldest on ties), give it the
+    group's latest last_used_at, and archive the rest. Returns the archived ids.
+    """
+    if not groups:
+        return []
+    wanted = [i for g in groups for i in g]
+    info = {}
+    for k in range(0, len(wanted), _IN_CHUNK):
+        rows = session.execute(
+            select(MemoryItem.id, MemoryItem.salience, MemoryItem.last_used_at).where(
+                MemoryItem.id.in_(wanted[k:k + _IN_CHUNK])
+            )
+        ).all()
+        info.update({r.id: r for r in rows})
+
+    keep_updates = []
+    drop: list[int] = []
+    for group in groups:
+        members = [info[i] for i in group if i in info]
+        if len(members) < 2:
+            continue
+        keep = max(members, key=lambda r: (r.salience, -r.id))
+        used = [r.last_used_at for r in members if r.last_used_at is not None]
+        if used and max(used) != keep.last_used_at:
+            keep_updates.append({"id": keep.id, "last_used_at": max(used)})
+        drop += [r.id for r in members if r.id != keep.id]
+
+    if keep_updates:
+        session.execute(update(MemoryItem), keep_updates)  # bulk UPDATE by primary key
+    _archive(session, drop, now)
+    return drop
+
+
+def _active_count(session: Session) -> int:
+    return session.execute(select(func.count()).select_from(MemoryItem).where(MemoryItem.archived_at.is_(None))).scalar() or 0
+
+
+def compact_memories(
+    session: Session,
+    half_life_days: float = 30.0,
+    archive_below: float = 0.05,
+    dedup_threshold: float = 0.95,
+    block_size: int = 1024,
+    storage: str = "f32",
+    now: datetime | None = None,
+    backend: MemoryBackend | None = None,
+) -> CompactionReport:
+    """
+    Decay -> archive low salience -> merge near-duplicates, in the caller's
+    transaction. Archived rows stay in the DB but drop out of every index load;
+    if `backend` is given they are also removed from it once the transaction
+    commits (nothing is removed on rollback, e.g. a dry run).
+    """
+    now = now or datetime.utcnow()
+    meta = AppMetaRepo(session)
+    since_raw = meta.get(DECAY_META_KEY)
+    since = datetime.fromisoformat(since_raw) if since_raw else None
+
+    report = CompactionReport(active_before=_active_count(session))
+    report.decayed = decay_salience(session, half_life_days, now, since)
+    meta.upsert(DECAY_META_KEY, now.isoformat())
+    archived: list[int] = []
+    if archive_below > 0:
+        archived = archive_low_salience(session, archive_below, now)
+        report.archived = len(archived)
+
+    rows = session.execute(embedding_rows_stmt()).all()
+    if rows:
+        ids, vectors, _ = decode_embedding_rows(rows)
+        report.row_bytes = vectors.shape[1] * storage_dtype(storage).itemsize + 16
+        if 0 < dedup_threshold <= 1:
+            kind_of = dict(
+                session.execute(select(MemoryItem.id, MemoryItem.kind).where(MemoryItem.archived_at.is_(None))).all()
+            )
+            kinds = np.array([kind_of.get(int(i), "") for i in ids], dtype=object)
+            groups = find_near_duplicates(ids, kinds, vectors, dedup_threshold, block_size=block_size)
+            report.groups = len(groups)
+            merged = merge_duplicates(session, groups, now)
+            report.merged = len(merged)
+            archived += merged
+
+    if backend is not None and archived:
+
+        def _on_commit(_session: Session) -> None:
+            report.removed = backend.remove(archived)
+
+        event.listen(session, "after_commit", _on_commit, once=True)
+
+    report.active_after = _active_count(session)
+    return report
@@ -12,6 +12,15 @@ class DbSettings:
     name: str
     user: str
     password: str
+    pool_size: int
+    max_overflow: int
+    pool_timeout: float  # seconds to wait for a free pooled connection
+    pool_recycle: int  # seconds; keep below the server's wait_timeout
+    pre_ping: bool  # ping on every checkout (extra round trip); recycle usually suffices
+    autocommit_reads: bool  # read-only sessions use a separate AUTOCOMMIT pool
+    connect_timeout: int
+    read_timeout: int  # 0 = no limit
+    write_timeout: int  # 0 = no limit
 
 
 @dataclass(frozen=True)
@@ -21,6 +30,44 @@ class LmStudioSettings:
     api_key: str
     temperature: float
     max_tokens: int
+    connect_timeout: float  # seconds
+    read_timeout: float  # seconds between bytes (streamed replies keep it alive)
+    max_connections: int
+    max_keepalive: int
+    keepalive_expiry: float  # seconds an idle pooled connection is kept
+
+
+@dataclass(frozen=True)
+class MemorySettings:
+    backend: str  # "numpy" | "qdrant" | "ivf"
+    snapshot_dir: str  # "" disables the on-disk embedding snapshot
+    vector_format: str  # "f32" | "f16" | "i8": embedding storage in the DB and the numpy index
+    qdrant_url: str  # ":memory:" = local in-process Qdrant
+    qdrant_collection: str
+    ivf_path: str
+    ivf_nlist: int
+    ivf_nprobe: int
+    embed_cache_size: int  # in-process LRU entries
+    embed_cache_path: str  # SQLite file for the persistent tier; "" = memory only
+    embed_warmup: bool  # load the embedding model in the background when chat starts
+    recall_k: int  # memories retrieved per chat turn; 0 disables recall
+    recall_min_score: float  # cosine score below which a hit is ignored
+    recall_min_salience: float
+    recall_budget_ms: int  # retrieval slower than this is skipped for the turn
+    touch_flush_seconds: float  # last_used_at write-behind interval
+    touch_max_pending: int  # flush early once this many distinct ids are buffered
+    dedup_threshold: float  # cosine at which remember/import reuses an existing memory; 0 = off
+    dedup_action: str  # "bump" (raise its salience) | "skip"
+    search_mode: str  # "vector" | "hybrid" (vector + BM25, rank-fused) | "prefilter" (BM25 candidates, vector-scored)
+    prefilter_size: int  # BM25 candidates scored in prefilter mode
+
+
+@dataclass(frozen=True)
+class ServerSettings:
+    host: str
+    port: int
+    max_concurrency: int  # chat turns talking to the model at once
+    max_queue: int  # turns allowed to wait for a slot; beyond that requests get 503
 
 
 @dataclass(frozen=True)
@@ -29,8 +76,20 @@ class Settings:
     log_level: str
     db: DbSettings
     model_adapter: str
-    model_context_messages: int
+    model_context_messages: int  # cap on history messages sent to the model
+    model_context_tokens: int  # model context window; prompt budget = this - lmstudio.max_tokens
+    summary_every_turns: int
+    summary_min_tokens: int
     lmstudio: LmStudioSettings
+    memory: MemorySettings
+    server: ServerSettings
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "on"}
 
 
 def load_settings() -> Settings:
@@ -45,10 +104,22 @@ def load_settings() -> Settings:
         name=os.getenv("MOLLY_DB_NAME", "molly").strip(),
         user=os.getenv("MOLLY_DB_USER", "molly").strip(),
         password=os.getenv("MOLLY_DB_PASSWORD", "").strip(),
+        pool_size=int(os.getenv("MOLLY_DB_POOL_SIZE", "5").strip()),
+        max_overflow=int(os.getenv("MOLLY_DB_MAX_OVERFLOW", "10").strip()),
+        pool_timeout=float(os.getenv("MOLLY_DB_POOL_TIMEOUT", "30").strip()),
+        pool_recycle=int(os.getenv("MOLLY_DB_POOL_RECYCLE", "1800").strip()),
+        pre_ping=_env_bool("MOLLY_DB_PRE_PING", False),
+        autocommit_reads=_env_bool("MOLLY_DB_AUTOCOMMIT_READS", False),
+        connect_timeout=int(os.getenv("MOLLY_DB_CONNECT_TIMEOUT", "10").strip()),
+        read_timeout=int(os.getenv("MOLLY_DB_READ_TIMEOUT", "0").strip()),
+        write_timeout=int(os.getenv("MOLLY_DB_WRITE_TIMEOUT", "0").strip()),
     )
 
     model_adapter = os.getenv("MOLLY_MODEL_ADAPTER", "dummy").strip().lower()
     model_context_messages = int(os.getenv("MOLLY_MODEL_CONTEXT_MESSAGES", "20").strip())
+    model_context_tokens = int(os.getenv("MOLLY_MODEL_CONTEXT_TOKENS", "4096").strip())
+    summary_every_turns = int(os.getenv("MOLLY_SUMMARY_EVERY_TURNS", "4").strip())
+    summary_min_tokens = int(os.getenv("MOLLY_SUMMARY_MIN_TOKENS", "1000").strip())
 
     lmstudio = LmStudioSettings(
         base_url=os.getenv("MOLLY_LMSTUDIO_BASE_URL", "http://127.0.0.1:1234/v1").strip().rstrip("/"),
@@ -56,6 +127,42 @@ def load_settings() -> Settings:
         api_key=os.getenv("MOLLY_LMSTUDIO_API_KEY", "lm-studio").strip(),
         temperature=float(os.getenv("MOLLY_LMSTUDIO_TEMPERATURE", "0.7").strip()),
         max_tokens=int(os.getenv("MOLLY_LMSTUDIO_MAX_TOKENS", "350").strip()),
+        connect_timeout=float(os.getenv("MOLLY_LMSTUDIO_CONNECT_TIMEOUT", "5").strip()),
+        read_timeout=float(os.getenv("MOLLY_LMSTUDIO_READ_TIMEOUT", "60").strip()),
+        max_connections=int(os.getenv("MOLLY_LMSTUDIO_MAX_CONNECTIONS", "4").strip()),
+        max_keepalive=int(os.getenv("MOLLY_LMSTUDIO_MAX_KEEPALIVE", "2").strip()),
+        keepalive_expiry=float(os.getenv("MOLLY_LMSTUDIO_KEEPALIVE_EXPIRY", "60").strip()),
+    )
+
+    memory = MemorySettings(
+        backend=os.getenv("MOLLY_MEMORY_BACKEND", "numpy").strip().lower(),
+        snapshot_dir=os.getenv("MOLLY_MEMORY_SNAPSHOT_DIR", "").strip(),
+        vector_format=os.getenv("MOLLY_MEMORY_VECTOR_FORMAT", "f32").strip().lower(),
+        qdrant_url=os.getenv("MOLLY_QDRANT_URL", "http://127.0.0.1:6333").strip().rstrip("/"),
+        qdrant_collection=os.getenv("MOLLY_QDRANT_COLLECTION", "molly_memories").strip(),
+        ivf_path=os.getenv("MOLLY_IVF_PATH", "").strip(),
+        ivf_nlist=int(os.getenv("MOLLY_IVF_NLIST", "256").strip()),
+        ivf_nprobe=int(os.getenv("MOLLY_IVF_NPROBE", "8").strip()),
+        embed_cache_size=int(os.getenv("MOLLY_EMBED_CACHE_SIZE", "4096").strip()),
+        embed_cache_path=os.getenv("MOLLY_EMBED_CACHE_PATH", "").strip(),
+        embed_warmup=_env_bool("MOLLY_EMBED_WARMUP", False),
+        recall_k=int(os.getenv("MOLLY_MEMORY_RECALL_K", "3").strip()),
+        recall_min_score=float(os.getenv("MOLLY_MEMORY_RECALL_MIN_SCORE", "0.35").strip()),
+        recall_min_salience=float(os.getenv("MOLLY_MEMORY_RECALL_MIN_SALIENCE", "0.1").strip()),
+        recall_budget_ms=int(os.getenv("MOLLY_MEMORY_RECALL_BUDGET_MS", "150").strip()),
+        touch_flush_seconds=float(os.getenv("MOLLY_MEMORY_TOUCH_FLUSH_SECONDS", "5").strip()),
+        touch_max_pending=int(os.getenv("MOLLY_MEMORY_TOUCH_MAX_PENDING", "256").strip()),
+        dedup_threshold=float(os.getenv("MOLLY_MEMORY_DEDUP_THRESHOLD", "0").strip()),
+        dedup_action=os.getenv("MOLLY_MEMORY_DEDUP_ACTION", "bump").strip().lower(),
+        search_mode=os.getenv("MOLLY_MEMORY_SEARCH_MODE", "vector").strip().lower(),
+        prefilter_size=int(os.getenv("MOLLY_MEMORY_PREFILTER_SIZE", "200").strip()),
+    )
+
+    server = ServerSettings(
+        host=os.getenv("MOLLY_SERVER_HOST", "127.0.0.1").strip(),
+        port=int(os.getenv("MOLLY_SERVER_PORT", "8080").strip()),
+        max_concurrency=int(os.getenv("MOLLY_SERVER_MAX_CONCURRENCY", "4").strip()),
+        max_queue=int(os.getenv("MOLLY_SERVER_MAX_QUEUE", "32").strip()),
     )
 
     return Settings(
@@ -64,5 +171,10 @@ def load_settings() -> Settings:
         db=db,
         model_adapter=model_adapter,
         model_context_messages=model_context_messages,
+        model_context_tokens=model_context_tokens,
+        summary_every_turns=summary_every_turns,
+        summary_min_tokens=summary_min_tokens,
         lmstudio=lmstudio,
+        memory=memory,
+        server=server,
     )
\ No newline at end of file
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import re
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+from molly.adapters import ChatMessage
+
+MESSAGE_OVERHEAD = 4  # role/separator tokens the chat template adds per message
+
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (no tokenizer load): the larger of ~4 chars/token and
+    ~0.75 tokens/word-or-symbol, which keeps code and punctuation-heavy text
+    from being undercounted.
+    """
+    if not text:
+        return 0
+    return max(1, len(text) // 4, (len(_WORDS.findall(text)) * 3) // 4)
+
+
+@dataclass
+class ContextWindow:
+    messages: list[ChatMessage]
+    usage: dict[str, int] = field(default_factory=dict)  # tokens per section + budget
+    dropped: int = 0  # history messages that didn't fit (oldest first)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.usage.get(k, 0) for k in ("system", "summary", "memory", "history"))
+
+
+class ContextBuilder:
+    """
+    Packs system prompt + rolling summary + as much recent history as fits the
+    prompt budget: context_tokens minus the reply reservation (max_tokens).
+
+    History is taken newest-first, so the oldest turns are dropped first (the
+    rolling summary is what covers them). The latest message is always kept.
+    The summary gets at most `summary_share` of the budget and is cut from the
+    front (oldest part) beyond that. Recalled memories go in one more system
+    message, best first, until `memory_share` of the budget is used.
+    """
+
+    def __init__(
+        self,
+        context_tokens: int,
+        reply_tokens: int,
+        max_messages: int = 20,
+        summary_share: float = 0.25,
+        memory_share: float = 0.15,
+    ):
+        self.context_tokens = context_tokens
+        self.reply_tokens = reply_tokens
+        self.max_messages = max_messages
+        self.summary_share = summary_share
+        self.memory_share = memory_share
+
+    @property
+    def budget(self) -> int:
+        return max(0, self.context_tokens - self.reply_tokens)
+
+    def build(
+        self,
+        system_prompt: str,
+        summary: str | None,
+        history: Sequence[tuple[str, str, int]],
+        memories: Sequence[str] = (),
+    ) -> ContextWindow:
+        """
+        `history` holds (role, content, tokens) oldest first, with tokens from
+        estimate_tokens (cached per message by the caller). `memories` are
+        formatted memory lines, best first.
+        """
+        budget = self.budget
+        system_tokens = estimate_tokens(system_prompt) + MESSAGE_OVERHEAD
+        messages = [ChatMessage(role="system", content=system_prompt)]
+        remaining = budget - system_tokens
+
+        summary_msg: ChatMessage | None = None
+        summary_tokens = 0
+        if summary:
+            text = f"Conversation summary:\n{summary}"
+            cap = int(budget * self.summary_share)
+            keep = cap * 4
+            while estimate_tokens(text) > cap and keep > 0:
+                text = f"Conversation summary:\n...{summary[-keep:]}"
+                keep = int(keep * 0.8)
+            summary_tokens = estimate_tokens(text) + MESSAGE_OVERHEAD
+            summary_msg = ChatMessage(role="system", content=text)
+            remaining -= summary_tokens
+
+        memory_msg: ChatMessage | None = None
+        memory_tokens = 0
+        if memories:
+            cap = int(budget * self.memory_share)
+            header = "Relevant long-term memories:"
+            used = estimate_tokens(header) + MESSAGE_OVERHEAD
+            kept = []
+            for line in memories:
+                cost = estimate_tokens(line)
+                if used + cost > cap:
+                    break
+                kept.append(line)
+                used += cost
+            if kept:
+                memory_msg = ChatMessage(role="system", content="\n".join([header, *kept]))
+                memory_tokens = used
+                remaining -= memory_tokens
+
+        recent = history[-self.max_messages:] if self.max_messages > 0 else history
+        picked: list[ChatMessage] = []
+        history_tokens = 0
+        for role, content, tokens in reversed(recent):
+            cost = tokens + MESSAGE_OVERHEAD
+            if picked and cost > remaining - history_tokens:
+                break
+            picked.append(ChatMessage(role=role, content=content))
+            history_tokens += cost
+
+        if summary_msg is not None:
+            messages.append(summary_msg)
+        if memory_msg is not None:
+            messages.append(memory_msg)
+        messages += reversed(picked)
+
+        return ContextWindow(
+            messages=messages,
+            usage={
+                "system": system_tokens,
+                "summary": summary_tokens,
+                "memory": memory_tokens,
+                "history": history_tokens,
+                "reply": self.reply_tokens,
+                "budget": budget,
+            },
+            dropped=len(history) - len(picked),
+        )
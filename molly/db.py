@@ -1,9 +1,18 @@
 from __future__ import annotations
 
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, exc, text
 from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+if TYPE_CHECKING:
+    from molly.config import DbSettings
 
 
 @dataclass(frozen=True)
@@ -14,6 +23,36 @@ class DbConnInfo:
     user: str
     password: str
 
+    # Pool (see create_db_engine)
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0  # seconds to wait for a free connection
+    pool_recycle: int = 1800  # seconds; replace connections before the server's wait_timeout
+    pre_ping: bool = False  # ping on every checkout (one extra round trip each)
+
+    # PyMySQL
+    connect_timeout: int = 10
+    read_timeout: int | None = None
+    write_timeout: int | None = None
+
+    @classmethod
+    def from_settings(cls, db: DbSettings) -> DbConnInfo:
+        return cls(
+            host=db.host,
+            port=db.port,
+            name=db.name,
+            user=db.user,
+            password=db.password,
+            pool_size=db.pool_size,
+            max_overflow=db.max_overflow,
+            pool_timeout=db.pool_timeout,
+            pool_recycle=db.pool_recycle,
+            pre_ping=db.pre_ping,
+            connect_timeout=db.connect_timeout,
+            read_timeout=db.read_timeout or None,
+            write_timeout=db.write_timeout or None,
+        )
+
 
 def build_db_url(cfg: DbConnInfo) -> str:
     # SQLAlchemy URL format for MariaDB/MySQL via PyMySQL:
@@ -21,9 +60,193 @@ def build_db_url(cfg: DbConnInfo) -> str:
     return f"mysql+pymysql://{cfg.user}:{cfg.password}@{cfg.host}:{cfg.port}/{cfg.name}"
 
 
-def create_db_engine(cfg: DbConnInfo) -> Engine:
-    # pool_pre_ping helps keep connections sane over long runtimes
-    return create_engine(build_db_url(cfg), pool_pre_ping=True, future=True)
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how often (and how long) a checkout had to block
+    waiting for a connection to be returned, for pool_stats(). Only the
+    blocking queue wait is timed; opening a new connection is not a wait.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+        queue_get = self._pool.get
+
+        def timed_get(block: bool = True, timeout: float | None = None):
+            if not block or not self._pool.empty():
+                return queue_get(block, timeout)
+            self.waits += 1
+            started = time.perf_counter()
+            try:
+                return queue_get(block, timeout)
+            finally:
+                self.wait_seconds += time.perf_counter() - started
+
+        self._pool.get = timed_get
+
+    def _do_get(self):
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+
+
+def create_db_engine(cfg: DbConnInfo, autocommit: bool = False) -> Engine:
+    # Instead of pinging on every checkout (an extra round trip each time), the
+    # default recycles connections before MariaDB's wait_timeout can drop them;
+    # set pre_ping for networks that cut idle connections sooner.
+    connect_args: dict = {"connect_timeout": cfg.connect_timeout}
+    if cfg.read_timeout:
+        connect_args["read_timeout"] = cfg.read_timeout
+    if cfg.write_timeout:
+        connect_args["write_timeout"] = cfg.write_timeout
+
+    options: dict = {}
+    if autocommit:
+        # Set once per physical connection (on connect), not per checkout; with
+        # no transaction to undo, returning a connection needs no ROLLBACK.
+        options.update(isolation_level="AUTOCOMMIT", pool_reset_on_return=None, skip_autocommit_rollback=True)
+
+    engine = create_engine(
+        build_db_url(cfg),
+        poolclass=TimedQueuePool,
+        pool_size=cfg.pool_size,
+        max_overflow=cfg.max_overflow,
+        pool_timeout=cfg.pool_timeout,
+        pool_recycle=cfg.pool_recycle,
+        pool_pre_ping=cfg.pre_ping,
+        pool_use_lifo=True,  # reuse warm connections; idle extras age out via recycle
+        connect_args=connect_args,
+        future=True,
+        **options,
+    )
+    install_round_trip_counter(engine)
+    install_pool_counters(engine)
+    return engine
+
+
+def reader_engine(cfg: DbConnInfo) -> Engine:
+    """
+    A separate pool whose connections are in AUTOCOMMIT from the start, for
+    read-only sessions: no transaction (or snapshot) is held open between
+    statements and checkin skips the reset ROLLBACK. Costs a second set of
+    pooled connections, hence opt-in (MOLLY_DB_AUTOCOMMIT_READS).
+    """
+    return create_db_engine(cfg, autocommit=True)
+
+
+@dataclass
+class PoolCounters:
+    checkouts: int = 0
+    checkins: int = 0
+    connects: int = 0  # new physical connections
+    invalidations: int = 0
+
+
+def install_pool_counters(engine: Engine) -> PoolCounters:
+    counters = engine.pool.__dict__.get("molly_counters")
+    if counters is not None:
+        return counters
+    counters = PoolCounters()
+    engine.pool.__dict__["molly_counters"] = counters
+
+    def _checkout(*_args) -> None:
+        counters.checkouts += 1
+
+    def _checkin(*_args) -> None:
+        counters.checkins += 1
+
+    def _connect(*_args) -> None:
+        counters.connects += 1
+
+    def _invalidate(*_args) -> None:
+        counters.invalidations += 1
+
+    event.listen(engine, "checkout", _checkout)
+    event.listen(engine, "checkin", _checkin)
+    event.listen(engine, "connect", _connect)
+    event.listen(engine, "invalidate", _invalidate)
+    return counters
+
+
+def pool_stats(engine: Engine) -> dict[str, float | int]:
+    """
+    Pool configuration and counters since the engine was created.
+    """
+    pool = engine.pool
+    stats: dict[str, float | int] = {}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(0, pool.overflow()),
+        )
+    counters = pool.__dict__.get("molly_counters")
+    if counters is not None:
+        stats.update(
+            checkouts=counters.checkouts,
+            connects=counters.connects,
+            invalidations=counters.invalidations,
+        )
+    if isinstance(pool, TimedQueuePool):
+        stats.update(
+            waits=pool.waits,
+            wait_ms=round(pool.wait_seconds * 1000, 1),
+            timeouts=pool.timeouts,
+        )
+    return stats
+
+
+@dataclass
+class RoundTrips:
+    statements: int = 0
+    commits: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.statements + self.commits
+
+
+# Set per unit of work (e.g. one chat turn). asyncio.to_thread copies the
+# context, so DB work pushed to worker threads is counted against its caller.
+_round_trips: ContextVar[RoundTrips | None] = ContextVar("molly_round_trips", default=None)
+
+
+def _on_execute(*_args) -> None:
+    counter = _round_trips.get()
+    if counter is not None:
+        counter.statements += 1
+
+
+def _on_commit(_conn) -> None:
+    counter = _round_trips.get()
+    if counter is not None:
+        counter.commits += 1
+
+
+def install_round_trip_counter(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _on_execute):
+        event.listen(engine, "before_cursor_execute", _on_execute)
+        event.listen(engine, "commit", _on_commit)
+
+
+@contextmanager
+def count_round_trips() -> Iterator[RoundTrips]:
+    """
+    Count statements + commits sent to the DB inside the block (on engines
+    made by create_db_engine / install_round_trip_counter).
+    """
+    counter = RoundTrips()
+    token = _round_trips.set(counter)
+    try:
+        yield counter
+    finally:
+        _round_trips.reset(token)
 
 
 def ping_db(engine: Engine) -> None:
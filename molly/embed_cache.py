@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    # Whitespace runs don't change the tokenization, so they shouldn't change the key.
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def cache_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache: (model name, normalized text hash) -> vector.
+
+    An in-process LRU sits in front of an optional SQLite file, so repeated
+    queries skip the model entirely and re-imports across processes reuse
+    earlier work. Cached arrays are read-only.
+    """
+
+    def __init__(self, max_items: int = 4096, path: str = ""):
+        self.max_items = int(max_items)
+        self.path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._lru: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    def get_many(self, model_name: str, texts: list[str]) -> list[np.ndarray | None]:
+        keys = [cache_key(model_name, t) for t in texts]
+        out: list[np.ndarray | None] = [None] * len(keys)
+        missing: dict[str, list[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vec = self._lru.get(key)
+                if vec is not None:
+                    self._lru.move_to_end(key)
+                    self.hits += 1
+                    out[i] = vec
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing and self._db is not None:
+                found = self._db.execute(
+                    f"SELECT key, vector FROM embedding_cache WHERE key IN ({','.join('?' * len(missing))})",
+                    list(missing),
+                ).fetchall()
+                for key, blob in found:
+                    vec = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vec)
+                    for i in missing.pop(key):
+                        out[i] = vec
+                        self.disk_hits += 1
+
+            self.misses += sum(len(v) for v in missing.values())
+        return out
+
+    def put_many(self, model_name: str, texts: list[str], vectors: np.ndarray) -> None:
+        rows = []
+        with self._lock:
+            for text, vec in zip(texts, vectors):
+                key = cache_key(model_name, text)
+                vec = np.array(vec, dtype=np.float32)
+                vec.setflags(write=False)
+                self._remember(key, vec)
+                rows.append((key, vec.tobytes()))
+
+            if self._db is not None and rows:
+                self._db.executemany("INSERT OR REPLACE INTO embedding_cache (key, vector) VALUES (?, ?)", rows)
+                self._db.commit()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self._lru),
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
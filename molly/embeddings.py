@@ -1,28 +1,117 @@
 from __future__ import annotations
 
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING
+
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from molly.embed_cache import EmbeddingCache, normalize_text
+
+if TYPE_CHECKING:
+    # Importing sentence_transformers pulls in torch (seconds), so it only
+    # happens inside get_model(), when a memory operation needs the model.
+    from sentence_transformers import SentenceTransformer
 
 DEFAULT_EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"  # 384-dim
 
 
 _model: SentenceTransformer | None = None
+_model_lock = threading.Lock()
+_cache: EmbeddingCache | None = None
 
 
 def get_model(model_name: str = DEFAULT_EMBED_MODEL) -> SentenceTransformer:
     global _model
     if _model is None:
-        _model = SentenceTransformer(model_name)
+        with _model_lock:  # a warm-up thread may be loading it already
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+
+                _model = SentenceTransformer(model_name)
     return _model
 
 
+def warm_model_async(model_name: str = DEFAULT_EMBED_MODEL) -> threading.Thread:
+    """
+    Load the model (and run one tiny encode) in a daemon thread, so the first
+    memory operation doesn't pay the import/load cost on the critical path.
+    """
+    log = logging.getLogger("molly.embeddings")
+
+    def _warm() -> None:
+        started = time.perf_counter()
+        try:
+            get_model(model_name).encode(["warm-up"], normalize_embeddings=True)
+            log.info("Embedding model warm in %.2fs", time.perf_counter() - started)
+        except Exception:
+            log.exception("Embedding model warm-up failed")
+
+    thread = threading.Thread(target=_warm, name="molly-embed-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache()
+    return _cache
+
+
+def configure_embedding_cache(max_items: int = 4096, path: str = "") -> EmbeddingCache:
+    """
+    Replace the process-wide cache (e.g. to add the persistent SQLite tier).
+    """
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = EmbeddingCache(max_items=max_items, path=path)
+    return _cache
+
+
 def embed_text(text: str, model_name: str = DEFAULT_EMBED_MODEL) -> np.ndarray:
     """
     Returns a float32 numpy vector. We normalize so cosine similarity is just dot().
     """
-    model = get_model(model_name)
-    vec = model.encode([text], normalize_embeddings=True)[0]
-    return np.asarray(vec, dtype=np.float32)
+    return embed_texts([text], model_name=model_name)[0]
+
+
+def embed_texts(
+    texts: list[str],
+    model_name: str = DEFAULT_EMBED_MODEL,
+    batch_size: int = 64,
+) -> np.ndarray:
+    """
+    Batched embed_text: returns a (len(texts), dim) float32 matrix of normalized
+    vectors, encoding `batch_size` strings per forward pass. Texts already in the
+    embedding cache (or repeated within the batch) skip the model.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    cache = get_embedding_cache()
+    found = cache.get_many(model_name, texts)
+
+    todo: dict[str, list[int]] = {}
+    for i, vec in enumerate(found):
+        if vec is None:
+            todo.setdefault(normalize_text(texts[i]), []).append(i)
+
+    if todo:
+        model = get_model(model_name)
+        fresh_texts = list(todo)
+        vecs = np.asarray(
+            model.encode(fresh_texts, batch_size=batch_size, normalize_embeddings=True),
+            dtype=np.float32,
+        )
+        cache.put_many(model_name, fresh_texts, vecs)
+        for text, vec in zip(fresh_texts, vecs):
+            for i in todo[text]:
+                found[i] = vec
+
+    return np.stack(found).astype(np.float32, copy=False)
 
 
 def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from molly.adapters import AsyncDummyAdapter, AsyncLMStudioAdapter, AsyncModelAdapter, ChatMessage
+from molly.config import Settings
+from molly.context import ContextBuilder, ContextWindow
+from molly.db import DbConnInfo, count_round_trips, create_db_engine, pool_stats, reader_engine
+from molly.jobs import SUMMARY_TAIL, PostTurnJobs, SummaryCadence
+from molly.recall import MemoryRecall, RecalledMemory
+from molly.repos import ConversationRepo, MessageRepo
+from molly.session import make_session_factory, session_scope
+from molly.turn_context import TurnContext, TurnContextService
+
+MAX_CACHED_CONVERSATIONS = 1024  # per-conversation state kept in process (LRU)
+HISTORY_PAGE = 100  # messages per history() page by default
+HISTORY_MAX_PAGE = 1000
+
+
+def get_async_adapter(settings: Settings) -> AsyncModelAdapter:
+    if settings.model_adapter == "dummy":
+        return AsyncDummyAdapter()
+    if settings.model_adapter == "lmstudio":
+        return AsyncLMStudioAdapter(settings)
+    raise ValueError(f"Unknown adapter: {settings.model_adapter}")
+
+
+class _TurnLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0  # turns holding or waiting for the lock
+
+
+class ChatEngine:
+    """
+    asyncio chat turn pipeline: persist user message + fetch context (and,
+    concurrently, recall long-term memories) -> generate (streamed) ->
+    persist reply -> schedule title/summary jobs.
+
+    Many conversations can be mid-turn at once in one event loop: model calls
+    are awaited on the async adapter, and the (blocking) SQLAlchemy work runs
+    in the default thread pool via asyncio.to_thread. Turns within a single
+    conversation are serialized so its history stays in order.
+
+    Context comes from a TurnContextService (cached tail, two short write
+    transactions per turn), with the DB round trips logged for each turn.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        session_factory: sessionmaker[Session],
+        adapter: AsyncModelAdapter,
+        read_session_factory: sessionmaker[Session] | None = None,
+    ):
+        self.settings = settings
+        self.sf = session_factory
+        self.read_sf = read_session_factory or session_factory  # read-only work (may be AUTOCOMMIT)
+        self.adapter = adapter
+        self.contexts = TurnContextService(
+            session_factory,
+            tail_limit=max(settings.model_context_messages, SUMMARY_TAIL),
+            read_session_factory=self.read_sf,
+            max_conversations=MAX_CACHED_CONVERSATIONS,
+        )
+        self.jobs = PostTurnJobs(self.contexts, adapter)
+        self.recall = MemoryRecall(settings, session_factory, read_session_factory=self.read_sf)
+        self.context_builder = ContextBuilder(
+            context_tokens=settings.model_context_tokens,
+            reply_tokens=settings.lmstudio.max_tokens,
+            max_messages=settings.model_context_messages,
+        )
+        self.log = logging.getLogger("molly.engine")
+
+        self._cadence: OrderedDict[str, SummaryCadence] = OrderedDict()
+        self._locks: dict[str, _TurnLock] = {}  # only conversations with a turn in flight
+
+    # ---- DB steps (run in worker threads) ----
+
+    def _conversation(self, conversation_id: str) -> dict | None:
+        with session_scope(self.read_sf) as s:
+            convo = ConversationRepo(s).get(conversation_id)
+            if convo is None:
+                return None
+            return {
+                "id": convo.id,
+                "title": convo.title,
+                "summary": convo.summary,
+                "created_at": convo.created_at.isoformat() if convo.created_at else None,
+            }
+
+    def _history(self, conversation_id: str, after_id: int, limit: int) -> list[dict]:
+        with session_scope(self.read_sf) as s:
+            return [
+                {
+                    "id": m.id,
+                    "role": m.role,
+                    "content": m.content,
+                    "created_at": m.created_at.isoformat() if m.created_at else None,
+                }
+                for m in MessageRepo(s).page(conversation_id, after_id=after_id, limit=limit)
+            ]
+
+    def _build_context(self, ctx: TurnContext, memories: list[RecalledMemory]) -> ContextWindow:
+        # Build model context:
+        # system prompt + (optional) summary + recalled memories
+        # + as many recent messages as the token budget allows
+        return self.context_builder.build(
+            ctx.state.system_prompt,
+            ctx.state.summary,
+            ctx.tail,
+            memories=[m.line() for m in memories],
+        )
+
+    # ---- public API ----
+
+    def db_stats(self) -> dict[str, object]:
+        stats: dict[str, object] = dict(pool_stats(self.sf.kw["bind"]))
+        if self.read_sf is not self.sf:
+            stats["reader"] = pool_stats(self.read_sf.kw["bind"])
+        return stats
+
+    async def get_conversation(self, conversation_id: str) -> dict | None:
+        return await asyncio.to_thread(self._conversation, conversation_id)
+
+    async def history(self, conversation_id: str, after_id: int = 0, limit: int = HISTORY_PAGE) -> list[dict]:
+        """
+        One page of messages with id > `after_id`, oldest first (at most
+        HISTORY_MAX_PAGE); pass the last id back to get the next page.
+        """
+        limit = max(1, min(int(limit), HISTORY_MAX_PAGE))
+        return await asyncio.to_thread(self._history, conversation_id, after_id, limit)
+
+    async def open_conversation(self, conversation_id: str | None = None) -> str | None:
+        """
+        Create a conversation (no id) or load an existing one; None if not found.
+        The system prompt is fetched once here and reused for every turn.
+        """
+        if conversation_id and self.contexts.cached(conversation_id) is not None:
+            return conversation_id
+        state = await asyncio.to_thread(self.contexts.open, conversation_id)
+        return None if state is None else state.id
+
+    async def turn(
+        self,
+        conversation_id: str,
+        user_text: str,
+        on_delta: Callable[[str], None] | None = None,
+    ) -> str:
+        """
+        Run one chat turn and return the assistant's reply. `on_delta` receives
+        reply text as it streams in.
+        """
+        with count_round_trips() as trips:
+            async with self._turn_lock(conversation_id):
+                started = time.perf_counter()
+                recall = self.recall.start(user_text)  # overlaps with the insert below
+                ctx = await asyncio.to_thread(self.contexts.begin_turn, conversation_id, user_text)
+                if ctx is None:
+                    if recall is not None:
+                        recall.cancel()
+                    raise LookupError(f"Conversation not found: {conversation_id}")
+                memories = await self.recall.result(recall, started)
+
+                window = self._build_context(ctx, memories)
+                self.log.debug(
+                    "Context: %d/%d tokens %s, %d messages dropped",
+                    window.total_tokens,
+                    window.usage["budget"],
+                    window.usage,
+                    window.dropped,
+                )
+                assistant_text = await self._stream_reply(window.messages, on_delta)
+
+                # Save assistant message (assembled from the stream)
+                await asyncio.to_thread(self.contexts.finish_turn, ctx, assistant_text)
+
+        self.log.info("Turn: db_round_trips=%d (statements=%d commits=%d)", trips.total, trips.statements, trips.commits)
+
+        # Auto-title + rolling summary run off the critical path (see molly.jobs),
+        # fed from the tail this turn already fetched.
+        self.jobs.submit(
+            conversation_id,
+            ctx.lines(SUMMARY_TAIL),
+            title=not ctx.state.title,
+            summary=self._summary_cadence(conversation_id).record_turn(user_text, assistant_text),
+        )
+        return assistant_text
+
+    @asynccontextmanager
+    async def _turn_lock(self, conversation_id: str) -> AsyncIterator[None]:
+        # Serializes turns per conversation; the entry is dropped once no turn
+        # holds or waits for it, so the dict only covers in-flight conversations.
+        entry = self._locks.get(conversation_id)
+        if entry is None:
+            entry = self._locks[conversation_id] = _TurnLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if not entry.users:
+                del self._locks[conversation_id]
+
+    def _summary_cadence(self, conversation_id: str) -> SummaryCadence:
+        cadence = self._cadence.get(conversation_id)
+        if cadence is None:
+            cadence = self._cadence[conversation_id] = SummaryCadence(
+                every_turns=self.settings.summary_every_turns,
+                min_tokens=self.settings.summary_min_tokens,
+            )
+            while len(self._cadence) > MAX_CACHED_CONVERSATIONS:
+                self._cadence.popitem(last=False)
+        self._cadence.move_to_end(conversation_id)
+        return cadence
+
+    async def _stream_reply(
+        self,
+        history: list[ChatMessage],
+        on_delta: Callable[[str], None] | None,
+    ) -> str:
+        """
+        Assemble the streamed reply, logging time-to-first-token and throughput
+        (stream chunks ~ tokens).
+        """
+        started = time.perf_counter()
+        first_at: float | None = None
+        parts: list[str] = []
+
+        async for delta in self.adapter.generate_stream(history):
+            if first_at is None:
+                delta = delta.lstrip()
+                if not delta:
+                    continue
+                first_at = time.perf_counter()
+            parts.append(delta)
+            if on_delta is not None:
+                on_delta(delta)
+
+        finished = time.perf_counter()
+        if first_at is not None:
+            gen_s = finished - first_at
+            self.log.info(
+                "Reply: ttft=%.0fms chunks=%d %.1f tok/s total=%.2fs",
+                (first_at - started) * 1000,
+                len(parts),
+                (len(parts) - 1) / gen_s if gen_s > 0 else 0.0,
+                finished - started,
+            )
+        return "".join(parts).strip()
+
+    async def aclose(self) -> None:
+        try:
+            await self.jobs.aclose()  # drains pending title/summary jobs, which still need the adapter
+            await self.recall.aclose()
+        finally:
+            await self.adapter.aclose()
+
+
+def create_chat_engine(settings: Settings) -> ChatEngine:
+    if settings.memory.recall_k > 0:
+        from molly.embeddings import configure_embedding_cache
+
+        configure_embedding_cache(settings.memory.embed_cache_size, settings.memory.embed_cache_path)
+    cfg = DbConnInfo.from_settings(settings.db)
+    db_engine = create_db_engine(cfg)
+    sf = make_session_factory(db_engine)
+    read_sf = make_session_factory(reader_engine(cfg)) if settings.db.autocommit_reads else sf
+    return ChatEngine(settings, sf, get_async_adapter(settings), read_session_factory=read_sf)
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from molly.compaction import low_salience_stmt
+from molly.memory_index import embedding_rows_stmt
+from molly.models import Conversation, MemoryEmbedding, MemoryItem, Message
+from molly.turn_context import context_load_stmt
+
+
+@dataclass
+class QueryPlan:
+    name: str
+    sql: str
+    rows: list[dict] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+
+
+def hot_queries(session: Session) -> list[tuple[str, Select]]:
+    """
+    The statements the chat loop and memory search run most, with sample
+    parameters (a real conversation id when one exists).
+    """
+    conversation_id = session.execute(select(Conversation.id).limit(1)).scalar() or "00000000-0000-0000-0000-000000000000"
+    return [
+        (
+            "message tail",
+            select(Message)
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.id.desc())
+            .limit(20),
+        ),
+        ("turn context load", context_load_stmt(conversation_id, tail_limit=20)),
+        (
+            "history page (keyset)",
+            select(Message.id, Message.role, Message.content, Message.created_at)
+            .where(Message.conversation_id == conversation_id, Message.id > 0)
+            .order_by(Message.id.asc())
+            .limit(1000),
+        ),
+        ("memory archive (low salience)", low_salience_stmt(0.05)),
+        (
+            "memory refresh (watermark)",
+            embedding_rows_stmt()
+            .where(MemoryEmbedding.id > 0)
+            .order_by(MemoryEmbedding.id.asc())
+            .limit(512),
+        ),
+        (
+            "memory hydrate",
+            select(MemoryItem).where(MemoryItem.id.in_([1, 2, 3]), MemoryItem.archived_at.is_(None)),
+        ),
+    ]
+
+
+def _mysql_warnings(row: dict) -> list[str]:
+    out = []
+    table = row.get("table")
+    extra = row.get("Extra") or ""
+    derived = str(table or "").startswith("<")  # <derivedN>: already LIMITed subquery rows
+    if row.get("type") == "ALL" and not derived:
+        out.append(f"full table scan on {table} (rows~{row.get('rows')})")
+    if "Using filesort" in extra:
+        out.append(f"filesort on {table}")
+    if "Using temporary" in extra:
+        out.append(f"temporary table for {table}")
+    return out
+
+
+def _sqlite_warnings(row: dict) -> list[str]:
+    detail = row.get("detail") or ""
+    derived = detail.startswith("SCAN anon_")  # already LIMITed subquery rows
+    if detail.startswith("SCAN") and "INDEX" not in detail and not derived:
+        return [f"full table scan: {detail}"]
+    if "TEMP B-TREE" in detail:
+        return [f"sort without index: {detail}"]
+    return []
+
+
+def explain(session: Session, name: str, stmt: Select) -> QueryPlan:
+    dialect = session.get_bind().dialect
+    sql = str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    plan = QueryPlan(name=name, sql=sql)
+
+    if dialect.name == "sqlite":
+        plan.rows = [dict(r) for r in session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).mappings()]
+        check = _sqlite_warnings
+    else:  # MariaDB / MySQL
+        plan.rows = [dict(r) for r in session.execute(text(f"EXPLAIN {sql}")).mappings()]
+        check = _mysql_warnings
+
+    for row in plan.rows:
+        plan.warnings += check(row)
+    return plan
+
+
+def explain_hot_queries(session: Session) -> list[QueryPlan]:
+    return [explain(session, name, stmt) for name, stmt in hot_queries(session)]
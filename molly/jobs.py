@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+from molly.adapters import AsyncModelAdapter, ChatMessage
+from molly.context import estimate_tokens
+from molly.prompts import SUMMARY_SYSTEM, TITLE_SYSTEM, make_summary_prompt, make_title_prompt
+from molly.turn_context import TurnContextService
+
+TITLE_TAIL = 6  # messages fed to the title prompt
+SUMMARY_TAIL = 12  # messages fed to the summary prompt
+
+
+class SummaryCadence:
+    """
+    Decides when a conversation's rolling summary is due: every `every_turns`
+    turns, or sooner once `min_tokens` (estimated) have accumulated since the
+    last one. every_turns=1 reproduces the old update-every-turn behaviour.
+    """
+
+    def __init__(self, every_turns: int = 4, min_tokens: int = 1000):
+        self.every_turns = max(1, int(every_turns))
+        self.min_tokens = int(min_tokens)
+        self.turns = 0
+        self.tokens = 0
+
+    def record_turn(self, *texts: str) -> bool:
+        self.turns += 1
+        self.tokens += sum(estimate_tokens(t) for t in texts)
+        due = self.turns >= self.every_turns or (self.min_tokens > 0 and self.tokens >= self.min_tokens)
+        if due:
+            self.turns = 0
+            self.tokens = 0
+        return due
+
+
+@dataclass
+class _Job:
+    title: bool = False
+    summary: bool = False
+    lines: list[str] = field(default_factory=list)  # latest "role: content" tail
+
+
+class PostTurnJobs:
+    """
+    Runs auto-title and rolling-summary generation as background asyncio tasks
+    so a chat turn returns as soon as the reply is saved.
+
+    Jobs are coalesced per conversation: submitting while that conversation's
+    job is queued or running just merges the flags and keeps the newest tail,
+    so a burst of turns costs one summary call instead of one per turn. The
+    tail and current title/summary come from the turn context (see
+    molly.turn_context), so jobs never re-read messages. At most `concurrency`
+    conversations are processed at once so background calls don't crowd out
+    chat replies on the model server.
+    """
+
+    def __init__(
+        self,
+        contexts: TurnContextService,
+        adapter: AsyncModelAdapter,
+        concurrency: int = 2,
+    ):
+        self.contexts = contexts
+        self.adapter = adapter
+        self.log = logging.getLogger("molly.jobs")
+
+        self._pending: dict[str, _Job] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._closed = False
+
+    def submit(
+        self,
+        conversation_id: str,
+        lines: list[str],
+        title: bool = False,
+        summary: bool = False,
+    ) -> None:
+        if self._closed or not (title or summary):
+            return
+        job = self._pending.setdefault(conversation_id, _Job())
+        job.title |= title
+        job.summary |= summary
+        job.lines = lines
+        if conversation_id not in self._tasks:
+            self._tasks[conversation_id] = asyncio.create_task(self._drain(conversation_id))
+
+    async def wait_idle(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def aclose(self, timeout: float | None = 30.0) -> None:
+        """
+        Finish queued jobs (up to `timeout` seconds), then cancel the rest.
+        """
+        self._closed = True
+        try:
+            await asyncio.wait_for(self.wait_idle(), timeout)
+        except asyncio.TimeoutError:
+            self.log.warning("Post-turn jobs still running at exit; abandoning them")
+            for task in list(self._tasks.values()):
+                task.cancel()
+
+    async def _drain(self, conversation_id: str) -> None:
+        try:
+            async with self._slots:
+                while conversation_id in self._pending:
+                    job = self._pending.pop(conversation_id)
+                    try:
+                        await self._process(conversation_id, job)
+                    except Exception:
+                        self.log.exception("Post-turn job failed (%s)", conversation_id)
+        finally:
+            self._tasks.pop(conversation_id, None)
+
+    async def _process(self, conversation_id: str, job: _Job) -> None:
+        state = self.contexts.cached(conversation_id)
+        if state is None:
+            return
+        lines = job.lines
+
+        if job.title and not state.title:
+            title_msgs = [
+                ChatMessage(role="system", content=TITLE_SYSTEM),
+                ChatMessage(role="user", content=make_title_prompt(lines[-TITLE_TAIL:])),
+            ]
+            try:
+                new_title = (await self.adapter.generate(title_msgs)).strip().strip('"').strip()
+                if new_title:
+                    await asyncio.to_thread(self.contexts.set_title, conversation_id, new_title)
+            except Exception:
+                self.log.exception("Auto-title failed")
+
+        if job.summary:
+            summary_msgs = [
+                ChatMessage(role="system", content=SUMMARY_SYSTEM),
+                ChatMessage(role="user", content=make_summary_prompt(state.summary, lines[-SUMMARY_TAIL:])),
+            ]
+            try:
+                new_summary = (await self.adapter.generate(summary_msgs)).strip()
+                if new_summary:
+                    await asyncio.to_thread(self.contexts.set_summary, conversation_id, new_summary)
+            except Exception:
+                self.log.exception("Summary update failed")
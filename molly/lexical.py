@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from collections.abc import Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from molly.models import MemoryItem
+
+_TOKENS = re.compile(r"\w+")
+
+# Function words carry no topic: a query and a memory sharing only "is" or
+# "my" must not count as a keyword match.
+STOPWORDS = frozenset(
+    """
+    a about after again all am an and any are as at be because been before being but by can could did do does
+    doing down during each few for from had has have having he her here hers him his how i if in into is it its
+    just me more most my no nor not now of off on once only or other our ours out over own same she should so
+    some such than that the their theirs them then there these they this those through to too under until up
+    very was we were what when where which while who whom why will with would you your yours
+    """.split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKENS.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+class Bm25Index:
+    """
+    In-process BM25 inverted index over memory_item "kind: text".
+
+    Complements the vector index for short keyword queries (names, ids,
+    project codes) that a sentence embedding matches poorly. Postings are
+    term -> {item id: term frequency}, so a query only touches the postings of
+    its own terms. Like MemoryIndex, refresh() pulls only items above the last
+    id seen; archived items are not added (and are filtered out again when
+    hits are hydrated, for ones archived after they were indexed).
+    """
+
+    name = "bm25"
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[int, int]] = {}
+        self._lengths: dict[int, int] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+        self.watermark = 0  # highest memory_item.id indexed
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, item_id: int, text: str) -> bool:
+        with self._lock:
+            if item_id in self._lengths:
+                return False
+            tokens = tokenize(text)
+            for term, tf in Counter(tokens).items():
+                self._postings.setdefault(term, {})[item_id] = tf
+            self._lengths[item_id] = len(tokens)
+            self._total_length += len(tokens)
+            return True
+
+    def refresh(self, session: Session, batch_size: int = 2000) -> int:
+        """
+        Index memory items above the watermark. Returns items added.
+        """
+        with self._lock:
+            stmt = (
+                select(MemoryItem.id, MemoryItem.kind, MemoryItem.text)
+                .where(MemoryItem.id > self.watermark, MemoryItem.archived_at.is_(None))
+                .order_by(MemoryItem.id.asc())
+                .execution_options(yield_per=batch_size)
+            )
+            added = 0
+            for item_id, kind, text in session.execute(stmt):
+                added += self.add(int(item_id), f"{kind}: {text}")
+                self.watermark = max(self.watermark, int(item_id))
+            return added
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._postings = {}
+            self._lengths = {}
+            self._total_length = 0
+            self.watermark = 0
+
+    def search(self, query: str, top_k: int = 5) -> list[tuple[int, float]]:
+        """
+        Return [(memory_item_id, bm25 score)] best-first; only items sharing
+        at least one non-stopword term with the query.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._lengths)
+            if not n or not terms or top_k <= 0:
+                return []
+            avg_len = self._total_length / n
+            scores: dict[int, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1.0 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for item_id, tf in postings.items():
+                    norm = self.k1 * (1.0 - self.b + self.b * self._lengths[item_id] / avg_len)
+                    scores[item_id] = scores.get(item_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return heapq.nlargest(int(top_k), scores.items(), key=lambda kv: kv[1])
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[tuple[int, float]]], k: int = 60) -> list[tuple[int, float]]:
+    """
+    Fuse best-first [(id, score)] lists by rank alone: sum of 1 / (k + rank).
+    Scores are scaled so an item ranked first in every list gets 1.0; raw
+    scores from different scorers (cosine, BM25) never need to be comparable.
+    """
+    if not rankings:
+        return []
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (item_id, _) in enumerate(ranking, start=1):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank)
+    scale = (k + 1) / len(rankings)
+    return sorted(((item_id, s * scale) for item_id, s in fused.items()), key=lambda kv: -kv[1])
+
+
+_lexical: Bm25Index | None = None
+_lexical_lock = threading.Lock()
+
+
+def get_lexical_index() -> Bm25Index:
+    """
+    Process-wide BM25 index, built lazily on the first hybrid search.
+    """
+    global _lexical
+    if _lexical is None:
+        with _lexical_lock:
+            if _lexical is None:
+                _lexical = Bm25Index()
+    return _lexical
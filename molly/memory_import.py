@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+from typing import Iterator
+
+MemoryRecord = tuple[str, str, float]  # (kind, text, salience)
+
+
+def detect_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    return "jsonl"
+
+
+def _record(row: dict) -> MemoryRecord:
+    salience = row.get("salience")
+    return (
+        str(row.get("kind") or ""),
+        str(row.get("text") or ""),
+        1.0 if salience in (None, "") else float(salience),
+    )
+
+
+def iter_records(path: str, fmt: str = "auto") -> Iterator[MemoryRecord]:
+    """
+    Stream (kind, text, salience) records from a JSONL file (one object per line)
+    or a CSV file with a header row. Only `kind` and `text` are required.
+    """
+    if fmt == "auto":
+        fmt = detect_format(path)
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                yield _record(row)
+        elif fmt == "jsonl":
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield _record(json.loads(line))
+        else:
+            raise ValueError(f"Unknown import format: {fmt}")
+
+
+def chunked(records: Iterator[MemoryRecord], size: int) -> Iterator[list[MemoryRecord]]:
+    chunk: list[MemoryRecord] = []
+    for rec in records:
+        chunk.append(rec)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,539 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from molly.models import MemoryEmbedding, MemoryItem
+from molly.vector_codec import F32, decode_blobs, dequantize, quantize, score_codes, storage_dtype
+
+SNAPSHOT_META = "meta.json"
+SNAPSHOT_IDS = "ids.npy"
+SNAPSHOT_VECTORS = "vectors.npy"
+SNAPSHOT_SCALES = "scales.npy"
+SNAPSHOT_SALIENCE = "salience.npy"
+
+
+def embedding_rows_stmt():
+    """
+    (memory_embedding.id, memory_item_id, vector, salience, encoding, scale) rows
+    of non-archived items. Plain column rows: no ORM objects are materialized
+    for the scan.
+    """
+    return select(
+        MemoryEmbedding.id,
+        MemoryEmbedding.memory_item_id,
+        MemoryEmbedding.vector,
+        MemoryItem.salience,
+        MemoryEmbedding.encoding,
+        MemoryEmbedding.scale,
+    ).join(MemoryItem, MemoryItem.id == MemoryEmbedding.memory_item_id).where(MemoryItem.archived_at.is_(None))
+
+
+def decode_embedding_rows(rows: Sequence[Row]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    embedding_rows_stmt() rows -> (item ids, float32 vectors, salience) arrays.
+    The BLOBs are decoded one frombuffer call per encoding instead of per row.
+    """
+    n = len(rows)
+    ids = np.fromiter((r[1] for r in rows), dtype=np.int64, count=n)
+    salience = np.fromiter((r[3] for r in rows), dtype=np.float32, count=n)
+    vectors = decode_blobs([r[2] for r in rows], [r[4] for r in rows], [r[5] for r in rows])
+    return ids, vectors, salience
+
+
+class MemoryIndex:
+    """
+    All memory embeddings as contiguous matrices (one row per MemoryItem).
+
+    Vectors are normalized in embed_text, so scoring a query is a single
+    matrix-vector product and top-k selection is an argpartition.
+
+    Rows are held in the `storage` format (f32, f16 or int8 + per-row scale).
+    For compact formats the first pass scores the compact rows, then the best
+    `rescore_factor * top_k` candidates are rescored in float32 with their
+    norms restored (quantization leaves them slightly off unit length).
+
+    The index is long-lived and has two segments:
+      - base: read-only rows, typically np.memmap views of an on-disk snapshot
+      - tail: rows appended in place (the buffer grows geometrically)
+
+    refresh() only pulls memory_embedding rows whose id is above the last one
+    seen, so keeping the index current costs O(new rows). Rows inserted by
+    another writer with a lower id that commit late are not picked up until
+    invalidate().
+    """
+
+    name = "numpy"
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        codes: np.ndarray,
+        scales: np.ndarray,
+        salience: np.ndarray,
+        storage: str = F32,
+        rescore_factor: int = 4,
+    ):
+        self.storage = storage
+        self.rescore_factor = int(rescore_factor)
+        self._dtype = storage_dtype(storage)
+        self._lock = threading.RLock()
+        self._set_base(ids, codes, scales, salience)
+
+        dim = self._base_codes.shape[1]
+        self._ids = np.empty(0, dtype=np.int64)
+        self._codes = np.empty((0, dim), dtype=self._dtype)
+        self._scales = np.empty(0, dtype=np.float32)
+        self._salience = np.empty(0, dtype=np.float32)
+        self._n = 0
+        self._positions: dict[int, int] = {}
+
+        # Highest memory_embedding.id folded in; 0 = never loaded.
+        self.watermark = 0
+
+    def _set_base(self, ids: np.ndarray, codes: np.ndarray, scales: np.ndarray, salience: np.ndarray) -> None:
+        # np.asarray keeps memmaps as-is (no copy) when the dtype already matches.
+        self._base_ids = np.asarray(ids, dtype=np.int64)
+        self._base_codes = np.asarray(codes, dtype=self._dtype)
+        if self._base_codes.ndim != 2:
+            self._base_codes = self._base_codes.reshape(self._base_ids.shape[0], -1)
+        self._base_scales = np.asarray(scales, dtype=np.float32)
+        self._base_salience = np.asarray(salience, dtype=np.float32)
+        self._base_order: np.ndarray | None = None  # argsort of base ids, built on first score_ids()
+
+    def __len__(self) -> int:
+        return int(self._base_ids.shape[0]) + self._n
+
+    @property
+    def dim(self) -> int:
+        return int(self._codes.shape[1] or self._base_codes.shape[1])
+
+    def segments(self) -> list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Non-empty (ids, codes, scales, salience) segments; views, not copies.
+        """
+        segs = [
+            (self._base_ids, self._base_codes, self._base_scales, self._base_salience),
+            (
+                self._ids[: self._n],
+                self._codes[: self._n],
+                self._scales[: self._n],
+                self._salience[: self._n],
+            ),
+        ]
+        return [seg for seg in segs if seg[0].shape[0]]
+
+    @property
+    def ids(self) -> np.ndarray:
+        segs = self.segments()
+        return np.concatenate([s[0] for s in segs]) if segs else np.empty(0, dtype=np.int64)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """
+        All rows as float32 (dequantized copy for compact formats).
+        """
+        segs = self.segments()
+        if not segs:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.concatenate([dequantize(s[1], s[2]) for s in segs])
+
+    @property
+    def salience(self) -> np.ndarray:
+        segs = self.segments()
+        return np.concatenate([s[3] for s in segs]) if segs else np.empty(0, dtype=np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s[1].nbytes + s[2].nbytes for s in self.segments())
+
+    @classmethod
+    def empty(cls, dim: int = 0, storage: str = F32) -> MemoryIndex:
+        return cls(
+            ids=np.empty(0, dtype=np.int64),
+            codes=np.empty((0, dim), dtype=storage_dtype(storage)),
+            scales=np.empty(0, dtype=np.float32),
+            salience=np.empty(0, dtype=np.float32),
+            storage=storage,
+        )
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Row], storage: str = F32) -> MemoryIndex:
+        """
+        Build from embedding_rows_stmt() rows.
+        """
+        index = cls.empty(storage=storage)
+        if rows:
+            index.add_many(*decode_embedding_rows(rows))
+            index.watermark = max(int(r[0]) for r in rows)
+        return index
+
+    @classmethod
+    def load(cls, session: Session, storage: str = F32) -> MemoryIndex:
+        """
+        One-shot full load from the DB.
+        """
+        return cls.from_rows(session.execute(embedding_rows_stmt()).all(), storage=storage)
+
+    @classmethod
+    def open_snapshot(cls, path: str, storage: str = F32) -> MemoryIndex | None:
+        """
+        Open a snapshot written by write_snapshot() as zero-copy memmaps.
+        Returns None if the snapshot is missing, inconsistent, or in another format.
+        """
+        meta_path = os.path.join(path, SNAPSHOT_META)
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format", F32) != storage:
+            return None
+
+        ids = np.load(os.path.join(path, SNAPSHOT_IDS), mmap_mode="r")
+        codes = np.load(os.path.join(path, SNAPSHOT_VECTORS), mmap_mode="r")
+        scales = np.load(os.path.join(path, SNAPSHOT_SCALES), mmap_mode="r")
+        salience = np.load(os.path.join(path, SNAPSHOT_SALIENCE), mmap_mode="r")
+
+        count = int(meta["count"])
+        if not (ids.shape[0] == codes.shape[0] == scales.shape[0] == salience.shape[0] == count):
+            return None  # caught a half-written snapshot; caller falls back to the DB
+
+        index = cls(ids=ids, codes=codes, scales=scales, salience=salience, storage=storage)
+        index.watermark = int(meta["watermark"])
+        return index
+
+    def _reserve(self, extra: int, dim: int) -> None:
+        if self.dim != dim:
+            if len(self):
+                raise ValueError(f"Embedding dim mismatch: index={self.dim} row={dim}")
+            self._codes = np.empty((0, dim), dtype=self._dtype)
+            self._base_codes = np.empty((0, dim), dtype=self._dtype)
+
+        need = self._n + extra
+        cap = self._ids.shape[0]
+        if need <= cap:
+            return
+
+        new_cap = max(need, cap * 2, 64)
+        ids = np.empty(new_cap, dtype=np.int64)
+        codes = np.empty((new_cap, dim), dtype=self._dtype)
+        scales = np.empty(new_cap, dtype=np.float32)
+        salience = np.empty(new_cap, dtype=np.float32)
+        ids[: self._n] = self._ids[: self._n]
+        codes[: self._n] = self._codes[: self._n]
+        scales[: self._n] = self._scales[: self._n]
+        salience[: self._n] = self._salience[: self._n]
+        self._ids, self._codes, self._scales, self._salience = ids, codes, scales, salience
+
+    def add_many(self, ids: np.ndarray, vectors: np.ndarray, salience: np.ndarray) -> int:
+        """
+        Append float32 rows (stored in the index format), skipping memory_item
+        ids already present. Returns rows added.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        salience = np.asarray(salience, dtype=np.float32)
+        if not ids.shape[0]:
+            return 0
+
+        with self._lock:
+            fresh = np.array([int(x) not in self._positions for x in ids], dtype=bool)
+            if self._base_ids.shape[0]:
+                fresh &= ~np.isin(ids, self._base_ids)
+            if not fresh.any():
+                return 0
+            if not fresh.all():
+                ids, vectors, salience = ids[fresh], vectors[fresh], salience[fresh]
+
+            codes, scales = quantize(vectors, self.storage)
+            m = ids.shape[0]
+            self._reserve(m, codes.shape[1])
+            start = self._n
+            self._ids[start : start + m] = ids
+            self._codes[start : start + m] = codes
+            self._scales[start : start + m] = scales
+            self._salience[start : start + m] = salience
+            for offset, x in enumerate(ids):
+                self._positions[int(x)] = start + offset
+            self._n += m
+            return m
+
+    def add(self, item_id: int, vector: np.ndarray, salience: float) -> bool:
+        return (
+            self.add_many(
+                np.array([item_id], dtype=np.int64),
+                np.asarray(vector, dtype=np.float32).reshape(1, -1),
+                np.array([salience], dtype=np.float32),
+            )
+            == 1
+        )
+
+    def refresh(self, session: Session) -> int:
+        """
+        Fold in memory_embedding rows above the watermark. Returns rows added.
+        """
+        with self._lock:
+            stmt = (
+                embedding_rows_stmt()
+                .where(MemoryEmbedding.id > self.watermark)
+                .order_by(MemoryEmbedding.id.asc())
+            )
+            rows = session.execute(stmt).all()
+            if not rows:
+                return 0
+
+            added = self.add_many(*decode_embedding_rows(rows))
+            self.watermark = max(self.watermark, int(rows[-1][0]))
+            return added
+
+    def remove(self, ids: Sequence[int]) -> int:
+        """
+        Drop rows for these memory_item ids (archived by compaction). Returns
+        rows removed. Removing from a memory-mapped snapshot base copies the
+        remaining base rows into memory.
+        """
+        drop = np.asarray(list(ids), dtype=np.int64)
+        if not drop.shape[0]:
+            return 0
+        with self._lock:
+            removed = 0
+            hit = np.isin(self._base_ids, drop)
+            if hit.any():
+                keep = ~hit
+                self._set_base(
+                    self._base_ids[keep],
+                    self._base_codes[keep],
+                    self._base_scales[keep],
+                    self._base_salience[keep],
+                )
+                removed += int(hit.sum())
+
+            hit = np.isin(self._ids[: self._n], drop)
+            if hit.any():
+                keep = np.flatnonzero(~hit)
+                m = keep.shape[0]
+                self._ids[:m] = self._ids[keep]
+                self._codes[:m] = self._codes[keep]
+                self._scales[:m] = self._scales[keep]
+                self._salience[:m] = self._salience[keep]
+                self._n = m
+                self._positions = {int(x): pos for pos, x in enumerate(self._ids[:m])}
+                removed += int(hit.sum())
+            return removed
+
+    def invalidate(self) -> None:
+        """
+        Drop everything (including any snapshot base); the next refresh()
+        reloads the full table.
+        """
+        with self._lock:
+            dim = self.dim
+            self._set_base(
+                np.empty(0, dtype=np.int64),
+                np.empty((0, dim), dtype=self._dtype),
+                np.empty(0, dtype=np.float32),
+                np.empty(0, dtype=np.float32),
+            )
+            self._ids = np.empty(0, dtype=np.int64)
+            self._codes = np.empty((0, dim), dtype=self._dtype)
+            self._scales = np.empty(0, dtype=np.float32)
+            self._salience = np.empty(0, dtype=np.float32)
+            self._positions = {}
+            self._n = 0
+            self.watermark = 0
+
+    def search(
+        self,
+        query_vec: np.ndarray,
+        top_k: int = 5,
+        min_salience: float = 0.0,
+    ) -> list[tuple[int, float]]:
+        """
+        Return [(memory_item_id, score)] best-first.
+        """
+        q = np.asarray(query_vec, dtype=np.float32)
+        with self._lock:
+            segs = self.segments()
+            if not segs or int(top_k) <= 0:
+                return []
+
+            parts = []
+            for _, codes, scales, salience in segs:
+                s = score_codes(codes, scales, q)
+                if min_salience > 0.0:
+                    s = np.where(salience >= min_salience, s, -np.inf)
+                parts.append(s)
+            ids = segs[0][0] if len(segs) == 1 else np.concatenate([seg[0] for seg in segs])
+
+            scores = parts[0] if len(parts) == 1 else np.concatenate(parts)
+            n = scores.shape[0]
+            k = min(int(top_k), n)
+            pool = k if self.storage == F32 else min(n, k * self.rescore_factor)
+
+            top = np.argpartition(-scores, pool - 1)[:pool] if pool < n else np.arange(n)
+            top = top[np.isfinite(scores[top])]
+            if self.storage != F32 and top.shape[0]:
+                scores = scores.copy()
+                scores[top] = self._rescore(segs, top, q)
+
+        top = top[np.argsort(-scores[top], kind="stable")][:k]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def score_ids(self, query_vec: np.ndarray, ids: Sequence[int]) -> list[tuple[int, float]]:
+        """
+        Exact cosine of the query against just these memory_item ids (those in
+        the index), best-first: vector scoring of a pre-filtered candidate set.
+        """
+        q = np.asarray(query_vec, dtype=np.float32)
+        want = np.unique(np.asarray(ids, dtype=np.int64))
+        with self._lock:
+            segs = self.segments()
+            if not segs or not want.shape[0]:
+                return []
+
+            rows, found = [], []
+            base_n = self._base_ids.shape[0]
+            if base_n:
+                if self._base_order is None:
+                    self._base_order = np.argsort(self._base_ids, kind="stable")
+                at = np.minimum(np.searchsorted(self._base_ids, want, sorter=self._base_order), base_n - 1)
+                hit = self._base_ids[self._base_order[at]] == want
+                rows.append(self._base_order[at[hit]])
+                found.append(want[hit])
+            tail = [(int(x), self._positions[int(x)]) for x in want if int(x) in self._positions]
+            if tail:
+                rows.append(np.array([pos for _, pos in tail], dtype=np.int64) + base_n)
+                found.append(np.array([x for x, _ in tail], dtype=np.int64))
+
+            rows_arr = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+            if not rows_arr.shape[0]:
+                return []
+            ids_arr = np.concatenate(found)
+            scores = self._rescore(segs, rows_arr, q)
+
+        order = np.argsort(-scores, kind="stable")
+        return [(int(ids_arr[i]), float(scores[i])) for i in order]
+
+    @staticmethod
+    def _rescore(segs, rows: np.ndarray, q: np.ndarray) -> np.ndarray:
+        # Exact float32 cosine for the candidate rows (global positions across segments).
+        bounds = np.cumsum([0] + [seg[0].shape[0] for seg in segs])
+        out = np.empty(rows.shape[0], dtype=np.float32)
+        for s, (_, codes, scales, _) in enumerate(segs):
+            mask = (rows >= bounds[s]) & (rows < bounds[s + 1])
+            if not mask.any():
+                continue
+            local = rows[mask] - bounds[s]
+            vecs = dequantize(codes[local], scales[local])
+            norms = np.linalg.norm(vecs, axis=1)
+            norms[norms == 0] = 1.0
+            out[mask] = (vecs @ q) / norms
+        return out
+
+
+def write_snapshot(session: Session, path: str, storage: str = F32, chunk_size: int = 5000) -> dict:
+    """
+    Export every non-archived embedding to `path` as .npy files (in the `storage` format)
+    plus a watermark.
+
+    Rows are streamed in chunks straight into memory-mapped output files, so
+    the export itself never holds the whole table in memory. Files are written
+    under temporary names and swapped in with meta.json last, which is what
+    open_snapshot() keys on.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    watermark = int(session.execute(select(func.coalesce(func.max(MemoryEmbedding.id), 0))).scalar_one())
+    count = int(
+        session.execute(
+            select(func.count())
+            .select_from(MemoryEmbedding)
+            .join(MemoryItem, MemoryItem.id == MemoryEmbedding.memory_item_id)
+            .where(MemoryEmbedding.id <= watermark, MemoryItem.archived_at.is_(None))  # same rows as the stream
+        ).scalar_one()
+    )
+
+    stmt = (
+        embedding_rows_stmt()
+        .where(MemoryEmbedding.id <= watermark)
+        .order_by(MemoryEmbedding.id.asc())
+        .execution_options(yield_per=chunk_size)
+    )
+
+    names = (SNAPSHOT_IDS, SNAPSHOT_VECTORS, SNAPSHOT_SCALES, SNAPSHOT_SALIENCE)
+    tmp = {name: os.path.join(path, f"{name}.tmp") for name in names}
+    open_memmap = np.lib.format.open_memmap
+    ids_out = open_memmap(tmp[SNAPSHOT_IDS], mode="w+", dtype=np.int64, shape=(count,))
+    scales_out = open_memmap(tmp[SNAPSHOT_SCALES], mode="w+", dtype=np.float32, shape=(count,))
+    sal_out = open_memmap(tmp[SNAPSHOT_SALIENCE], mode="w+", dtype=np.float32, shape=(count,))
+    codes_out = None
+
+    written = 0
+    for chunk in session.execute(stmt).partitions():
+        chunk = chunk[: count - written]  # rows committed between count and scan
+        if not chunk:
+            break
+        ids, vectors, salience = decode_embedding_rows(chunk)
+        codes, scales = quantize(vectors, storage)
+        if codes_out is None:
+            codes_out = open_memmap(
+                tmp[SNAPSHOT_VECTORS], mode="w+", dtype=codes.dtype, shape=(count, codes.shape[1])
+            )
+        m = ids.shape[0]
+        ids_out[written : written + m] = ids
+        codes_out[written : written + m] = codes
+        scales_out[written : written + m] = scales
+        sal_out[written : written + m] = salience
+        written += m
+
+    if codes_out is None:
+        codes_out = open_memmap(tmp[SNAPSHOT_VECTORS], mode="w+", dtype=storage_dtype(storage), shape=(0, 0))
+    dim = int(codes_out.shape[1])
+
+    for arr in (ids_out, codes_out, scales_out, sal_out):
+        arr.flush()
+    del ids_out, codes_out, scales_out, sal_out
+
+    if written != count:
+        # Rows vanished mid-export; keep the old snapshot rather than a short one.
+        for p in tmp.values():
+            os.remove(p)
+        raise RuntimeError(f"Snapshot aborted: expected {count} rows, read {written}")
+
+    for name, p in tmp.items():
+        os.replace(p, os.path.join(path, name))
+
+    meta = {"watermark": watermark, "count": count, "dim": dim, "format": storage}
+    meta_tmp = os.path.join(path, f"{SNAPSHOT_META}.tmp")
+    with open(meta_tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(meta_tmp, os.path.join(path, SNAPSHOT_META))
+    return meta
+
+
+_index: MemoryIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_memory_index(snapshot_dir: str | None = None, storage: str = F32) -> MemoryIndex:
+    """
+    Process-wide index, built lazily on first use (one per chat session / server).
+    If a snapshot directory is given on that first call, the index starts from
+    the memory-mapped snapshot and only rows newer than its watermark are read
+    from the DB.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = MemoryIndex.open_snapshot(snapshot_dir, storage=storage) if snapshot_dir else None
+                _index = index if index is not None else MemoryIndex.empty(storage=storage)
+    return _index
@@ -2,14 +2,32 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Iterable
+from typing import Iterable, Protocol, Sequence
 
 import numpy as np
+from sqlalchemy import case, event, insert, literal_column, select, update
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 
-from molly.embeddings import embed_text, cosine_sim
+from molly.config import Settings
+from molly.embeddings import embed_text, embed_texts
+from molly.lexical import get_lexical_index, reciprocal_rank_fusion
+from molly.memory_index import get_memory_index
 from molly.models import MemoryEmbedding, MemoryItem
+from molly.vector_codec import F32, I8, decode_blobs, encode_vector, quantize
+
+
+DEDUP_BUMP_ACTION = "bump"
+DEDUP_SKIP_ACTION = "skip"
+DEDUP_BUMP = 0.1  # salience added to a memory that is remembered again
+DEDUP_CANDIDATES = 5  # nearest neighbours checked for a same-kind duplicate
+
+SEARCH_VECTOR = "vector"  # cosine over the vector backend only
+SEARCH_HYBRID = "hybrid"  # vector + BM25, fused by reciprocal rank
+SEARCH_PREFILTER = "prefilter"  # BM25 candidates first, vector-scored, then fused
+SEARCH_MODES = (SEARCH_VECTOR, SEARCH_HYBRID, SEARCH_PREFILTER)
+HYBRID_POOL = 4  # each ranker contributes top_k * HYBRID_POOL candidates to the fusion
+_INSERT_CHUNK = 500  # rows per multi-row INSERT (keeps statements under max_allowed_packet)
 
 
 @dataclass
@@ -18,14 +36,135 @@ class MemoryHit:
     score: float
 
 
+class MemoryBackend(Protocol):
+    """
+    Vector search over memory items. MariaDB is always the source of truth;
+    a backend only maps embeddings to memory_item ids. A backend may also
+    offer score_ids(query_vec, ids) -> [(id, score)] for pre-filtered search
+    (MemoryIndex does).
+    """
+
+    name: str
+
+    def refresh(self, session: Session) -> int:
+        """Catch up with rows committed since the last refresh."""
+        ...
+
+    def add(self, item_id: int, vector: np.ndarray, salience: float) -> bool:
+        """Index one committed row."""
+        ...
+
+    def add_many(self, ids: np.ndarray, vectors: np.ndarray, salience: np.ndarray) -> int:
+        """Index committed rows; returns how many were new."""
+        ...
+
+    def remove(self, ids: Sequence[int]) -> int:
+        """Drop archived items; returns how many were indexed."""
+        ...
+
+    def invalidate(self) -> None:
+        """Forget sync state so the next refresh() rebuilds."""
+        ...
+
+    def search(
+        self,
+        query_vec: np.ndarray,
+        top_k: int = 5,
+        min_salience: float = 0.0,
+    ) -> list[tuple[int, float]]:
+        """Return [(memory_item_id, score)] best-first."""
+        ...
+
+
+_backend: MemoryBackend | None = None
+
+
+def get_memory_backend(settings: Settings) -> MemoryBackend:
+    """
+    Process-wide backend selected by MOLLY_MEMORY_BACKEND (created once).
+    """
+    global _backend
+    if _backend is not None:
+        return _backend
+
+    backend = settings.memory.backend
+    if backend == "numpy":
+        _backend = get_memory_index(settings.memory.snapshot_dir, storage=settings.memory.vector_format)
+    elif backend == "qdrant":
+        from molly.vectorstore import QdrantMemoryBackend, QdrantSettings, get_qdrant_client
+
+        cfg = QdrantSettings(url=settings.memory.qdrant_url, collection=settings.memory.qdrant_collection)
+        _backend = QdrantMemoryBackend(get_qdrant_client(cfg), cfg)
+    elif backend == "ivf":
+        from molly.ann import IvfIndex
+
+        cfg = settings.memory
+        index = IvfIndex.load(cfg.ivf_path, nprobe=cfg.ivf_nprobe)
+        if index is None:
+            index = IvfIndex(nlist=cfg.ivf_nlist, nprobe=cfg.ivf_nprobe, path=cfg.ivf_path)
+        _backend = index
+    else:
+        raise ValueError(f"Unknown memory backend: {backend}")
+    return _backend
+
+
+def make_memory_repo(session: Session, settings: Settings) -> MemoryRepo:
+    return MemoryRepo(
+        session,
+        backend=get_memory_backend(settings),
+        vector_format=settings.memory.vector_format,
+        dedup_threshold=settings.memory.dedup_threshold,
+        dedup_action=settings.memory.dedup_action,
+        search_mode=settings.memory.search_mode,
+        prefilter_size=settings.memory.prefilter_size,
+    )
+
+
 class MemoryRepo:
     """
-    DB-backed memory store with in-process cosine similarity search.
-    Stores embeddings as float32 bytes in MemoryEmbedding.vector.
+    DB-backed memory store with pluggable vector search.
+    Stores embeddings in MemoryEmbedding.vector in `vector_format` (f32, f16 or
+    int8 + scale); by default search scores them as one matrix via the
+    process-wide MemoryIndex, so only rows added since the last search are
+    read from the DB.
+
+    With `dedup_threshold` > 0, inserts first ask the backend for the nearest
+    existing memories (top DEDUP_CANDIDATES: one matrix-vector product on the
+    numpy index). If the closest live, same-kind one is at or above the
+    threshold, the memory is not inserted again; with dedup_action "bump" its
+    salience is raised by DEDUP_BUMP (up to 1.0) and last_used_at set, with
+    "skip" it is left as is.
+
+    `search_mode` picks the ranking: vector only, hybrid (vector and the
+    in-process BM25 index from molly.lexical, fused by reciprocal rank), or
+    prefilter (the best `prefilter_size` BM25 matches are the only candidates
+    that get vector-scored; needs a backend with score_ids, i.e. numpy, and
+    falls back to hybrid when no memory shares a term with the query). In
+    both, keyword matches must clear the same cosine floor as vector hits.
     """
 
-    def __init__(self, session: Session):
+    def __init__(
+        self,
+        session: Session,
+        backend: MemoryBackend | None = None,
+        vector_format: str = F32,
+        dedup_threshold: float = 0.0,
+        dedup_action: str = DEDUP_BUMP_ACTION,
+        search_mode: str = SEARCH_VECTOR,
+        prefilter_size: int = 200,
+    ):
+        if dedup_action not in (DEDUP_BUMP_ACTION, DEDUP_SKIP_ACTION):
+            raise ValueError(f"Unknown dedup action: {dedup_action}")
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {search_mode}")
         self.session = session
+        self.backend = backend if backend is not None else get_memory_index()
+        self.vector_format = vector_format
+        self.dedup_threshold = dedup_threshold
+        self.dedup_action = dedup_action
+        self.deduplicated = 0  # inserts answered by an existing memory
+        self.search_mode = search_mode
+        self.prefilter_size = prefilter_size
 
     def add_memory(self, kind: str, text: str, salience: float = 1.0) -> MemoryItem:
         kind = (kind or "").strip()
@@ -35,6 +174,15 @@ class MemoryRepo:
         if not text:
             raise ValueError("text is required")
 
+        vec = embed_text(f"{kind}: {text}")
+        if self.dedup_threshold > 0:
+            existing_id = self._find_duplicates([kind], vec.reshape(1, -1))[0]
+            if existing_id is not None:
+                self.deduplicated += 1
+                if self.dedup_action == DEDUP_BUMP_ACTION:
+                    self._bump([existing_id])
+                return self.session.get(MemoryItem, existing_id, populate_existing=True)
+
         item = MemoryItem(
             kind=kind,
             text=text,
@@ -44,10 +192,12 @@ class MemoryRepo:
         self.session.add(item)
         self.session.flush()  # ensures item.id exists
 
-        vec = embed_text(f"{kind}: {text}")
+        blob, scale = encode_vector(vec, self.vector_format)
         emb = MemoryEmbedding(
             memory_item_id=item.id,
-            vector=vec.tobytes(),
+            vector=blob,
+            encoding=self.vector_format,
+            scale=scale,
         )
         self.session.add(emb)
 
@@ -57,54 +207,345 @@ class MemoryRepo:
         except Exception:
             pass
 
+        self._index_after_commit([item.id], vec.reshape(1, -1), [item.salience])
         return item
 
+    def add_memories(
+        self,
+        records: Sequence[tuple[str, str, float]],
+        batch_size: int = 64,
+    ) -> list[int]:
+        """
+        Bulk add_memory for (kind, text, salience) records. Embeds in batches and
+        writes each table with one multi-row INSERT. Returns the new item ids
+        (duplicates answered by existing memories, or by an earlier record of
+        the same batch, are not inserted).
+        """
+        rows = []
+        for kind, text, salience in records:
+            kind = (kind or "").strip()
+            text = (text or "").strip()
+            if not kind:
+                raise ValueError("kind is required")
+            if not text:
+                raise ValueError("text is required")
+            rows.append({"kind": kind, "text": text, "salience": float(salience), "created_at": datetime.utcnow()})
+        if not rows:
+            return []
+
+        vecs = embed_texts([f"{r['kind']}: {r['text']}" for r in rows], batch_size=batch_size)
+        if self.dedup_threshold > 0:
+            rows, vecs = self._dedup_batch(rows, vecs)
+            if not rows:
+                return []
+
+        ids = self._insert_items(rows)
+
+        codes, scales = quantize(vecs, self.vector_format)
+        has_scale = self.vector_format == I8
+        self.session.execute(
+            insert(MemoryEmbedding),
+            [
+                {
+                    "memory_item_id": item_id,
+                    "vector": code.tobytes(),
+                    "encoding": self.vector_format,
+                    "scale": float(scale) if has_scale else None,
+                }
+                for item_id, code, scale in zip(ids, codes, scales)
+            ],
+        )
+
+        self._index_after_commit(ids, vecs, [r["salience"] for r in rows])
+        return ids
+
+    def _insert_items(self, rows: list[dict]) -> list[int]:
+        """
+        INSERT memory_item rows and return their ids in row order, in as few
+        statements as the dialect allows:
+          - ordered executemany RETURNING (SQLite, PostgreSQL)
+          - one multi-row INSERT ... RETURNING id (MariaDB >= 10.5)
+          - one multi-row INSERT, ids read back as the LAST_INSERT_ID() range
+            (MySQL: InnoDB gives a multi-row INSERT with a known row count
+            consecutive ids, auto_increment_increment apart)
+          - an ORM flush (one INSERT per row) anywhere else.
+        """
+        dialect = self.session.get_bind().dialect
+        if dialect.insert_executemany_returning_sort_by_parameter_order:
+            return list(
+                self.session.scalars(
+                    insert(MemoryItem).returning(MemoryItem.id, sort_by_parameter_order=True),
+                    rows,
+                )
+            )
+        if dialect.name == "mysql":
+            ids: list[int] = []
+            for k in range(0, len(rows), _INSERT_CHUNK):
+                chunk = rows[k:k + _INSERT_CHUNK]
+                if dialect.insert_returning:
+                    # Auto-increment ids ascend in VALUES order within one statement.
+                    ids += sorted(self.session.scalars(insert(MemoryItem).values(chunk).returning(MemoryItem.id)))
+                    continue
+                self.session.execute(insert(MemoryItem).values(chunk))
+                first, step = self.session.execute(
+                    select(func.last_insert_id(), literal_column("@@session.auto_increment_increment"))
+                ).one()
+                ids += range(int(first), int(first) + len(chunk) * int(step), int(step))
+            return ids
+
+        items = [MemoryItem(**r) for r in rows]
+        self.session.add_all(items)
+        self.session.flush()
+        return [item.id for item in items]
+
+    def _find_duplicates(self, kinds: Sequence[str], vectors: np.ndarray) -> list[int | None]:
+        """
+        Per vector, the id of the nearest live, same-kind memory at or above
+        dedup_threshold, else None. The backend's top DEDUP_CANDIDATES are
+        checked, so a closer item of another kind (or one archived since it
+        was indexed) doesn't hide a real duplicate.
+        """
+        self.backend.refresh(self.session)
+        candidates: list[list[int]] = []
+        for vec in vectors:
+            hits = self.backend.search(vec, top_k=DEDUP_CANDIDATES)
+            candidates.append([item_id for item_id, score in hits if score >= self.dedup_threshold])
+
+        wanted = {i for ids in candidates for i in ids}
+        if not wanted:
+            return [None] * len(candidates)
+        kind_of = dict(
+            self.session.execute(
+                select(MemoryItem.id, MemoryItem.kind).where(
+                    MemoryItem.id.in_(wanted), MemoryItem.archived_at.is_(None)
+                )
+            ).all()
+        )
+        return [next((i for i in ids if kind_of.get(i) == kind), None) for ids, kind in zip(candidates, kinds)]
+
+    def _dedup_batch(self, rows: list[dict], vecs: np.ndarray) -> tuple[list[dict], np.ndarray]:
+        # Against the index first, then within the batch (an upper-triangle
+        # similarity matrix: keep the first of each same-kind pair).
+        existing = self._find_duplicates([r["kind"] for r in rows], vecs)
+        keep = [i for i, e in enumerate(existing) if e is None]
+        dup_ids = [e for e in existing if e is not None]
+
+        sims = vecs[keep] @ vecs[keep].T
+        kept_pos: list[int] = []
+        for pos, i in enumerate(keep):
+            twin = next(
+                (
+                    k
+                    for k in kept_pos
+                    if sims[k, pos] >= self.dedup_threshold and rows[keep[k]]["kind"] == rows[i]["kind"]
+                ),
+                None,
+            )
+            if twin is None:
+                kept_pos.append(pos)
+            else:
+                first = rows[keep[twin]]
+                first["salience"] = max(first["salience"], rows[i]["salience"])
+        kept = [keep[pos] for pos in kept_pos]
+
+        self.deduplicated += len(rows) - len(kept)
+        if dup_ids and self.dedup_action == DEDUP_BUMP_ACTION:
+            self._bump(dup_ids)
+        return [rows[i] for i in kept], vecs[kept]
+
+    def _bump(self, ids: Iterable[int]) -> None:
+        bumped = MemoryItem.salience + DEDUP_BUMP
+        self.session.execute(
+            update(MemoryItem)
+            .where(MemoryItem.id.in_(set(ids)))
+            .values(
+                salience=case(
+                    (MemoryItem.salience >= 1.0, MemoryItem.salience),
+                    (bumped > 1.0, 1.0),
+                    else_=bumped,
+                ),
+                last_used_at=func.now(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    def _index_after_commit(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        salience: Sequence[float],
+    ) -> None:
+        # Only committed rows reach the backend; a rollback discards them.
+        pending = self.session.info.get("molly_memory_pending")
+        if pending is None:
+            pending = self.session.info["molly_memory_pending"] = []
+            backend = self.backend
+
+            def _on_commit(session: Session) -> None:
+                batches = session.info.pop("molly_memory_pending", [])
+                for batch_ids, batch_vectors, batch_salience in batches:
+                    backend.add_many(
+                        np.asarray(batch_ids, dtype=np.int64),
+                        batch_vectors,
+                        np.asarray(batch_salience, dtype=np.float32),
+                    )
+
+            def _on_rollback(session: Session, _previous_transaction) -> None:
+                session.info.pop("molly_memory_pending", None)
+
+            event.listen(self.session, "after_commit", _on_commit, once=True)
+            event.listen(self.session, "after_soft_rollback", _on_rollback, once=True)
+        pending.append((list(ids), vectors, list(salience)))
+
     def search(
         self,
         query: str,
         top_k: int = 5,
         min_salience: float = 0.0,
+        min_score: float = 0.0,
+        mode: str | None = None,
     ) -> list[tuple[MemoryItem, float]]:
+        """
+        Best-first (item, score). Scores are cosine in vector mode and fused
+        reciprocal-rank scores (1.0 = ranked first by every ranker) otherwise.
+        `min_score` is a cosine floor for every candidate in every mode: keyword
+        (BM25) matches are vector-scored too and dropped below it, so a shared
+        word alone never makes an unrelated memory relevant. `min_salience`
+        likewise filters keyword candidates before they are fused.
+        """
         query = (query or "").strip()
         if not query:
             return []
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        top_k = max(1, int(top_k))
 
         qv = embed_text(query)
 
-        # Load items + embedding rows. We'll be tolerant if relationship isn't present.
-        items = (
-            self.session.query(MemoryItem)
-            .filter(MemoryItem.salience >= float(min_salience))
-            .all()
-        )
+        # Pull only rows newer than the backend's watermark, search, then
+        # hydrate only the winners.
+        self.backend.refresh(self.session)
+        if mode == SEARCH_VECTOR:
+            hits = self.backend.search(qv, top_k=top_k, min_salience=min_salience)
+            return self._hydrate([h for h in hits if h[1] >= min_score], min_salience=min_salience)
+
+        lexical = get_lexical_index()
+        lexical.refresh(self.session)
+        pool = top_k * HYBRID_POOL
 
-        scored: list[tuple[MemoryItem, float]] = []
-        for item in items:
-            emb: MemoryEmbedding | None = None
+        if mode == SEARCH_PREFILTER and getattr(self.backend, "score_ids", None) is not None:
+            candidates = self._keyword_candidates(query, max(pool, self.prefilter_size), min_salience)
+            if candidates:
+                vector = [h for h in self._score_ids(qv, [i for i, _ in candidates]) if h[1] >= min_score]
+                passed = {i for i, _ in vector}
+                keyword = [h for h in candidates if h[0] in passed]
+                fused = reciprocal_rank_fusion([keyword[:pool], vector[:pool]])
+                return self._hydrate(fused[:top_k], min_salience=min_salience)
 
-            # If relationship exists (preferred)
-            if hasattr(item, "embedding"):
-                emb = getattr(item, "embedding", None)
+        vector = [h for h in self.backend.search(qv, top_k=pool, min_salience=min_salience) if h[1] >= min_score]
+        # With a salience floor, look deeper so low-salience keyword matches
+        # don't crowd the eligible ones out of the pool.
+        depth = max(pool, self.prefilter_size) if min_salience > 0 else pool
+        keyword = self._keyword_candidates(query, depth, min_salience)
+        if keyword:
+            passed = {i for i, score in self._score_ids(qv, [i for i, _ in keyword]) if score >= min_score}
+            keyword = [h for h in keyword if h[0] in passed][:pool]
+        fused = reciprocal_rank_fusion([vector, keyword])
+        return self._hydrate(fused[:top_k], min_salience=min_salience)
 
-            # Fallback: query embedding by FK
-            if emb is None:
-                emb = (
-                    self.session.query(MemoryEmbedding)
-                    .filter(MemoryEmbedding.memory_item_id == item.id)
-                    .one_or_none()
+    def _keyword_candidates(self, query: str, limit: int, min_salience: float) -> list[tuple[int, float]]:
+        """
+        BM25 matches best-first, minus those below `min_salience` (or archived)
+        when a floor is set: one SELECT id over the candidates, so the fused
+        top_k isn't cut short by rows _hydrate would drop anyway.
+        """
+        hits = get_lexical_index().search(query, top_k=limit)
+        if not hits or min_salience <= 0:
+            return hits
+        eligible = set(
+            self.session.scalars(
+                select(MemoryItem.id).where(
+                    MemoryItem.id.in_([i for i, _ in hits]),
+                    MemoryItem.archived_at.is_(None),
+                    MemoryItem.salience >= min_salience,
                 )
+            )
+        )
+        return [h for h in hits if h[0] in eligible]
+
+    def _score_ids(self, query_vec: np.ndarray, ids: list[int]) -> list[tuple[int, float]]:
+        """
+        Cosine of the query against these memory_item ids, best-first: from
+        the backend when it has score_ids (numpy), else from the stored
+        embeddings (one SELECT for a few dozen keyword candidates).
+        """
+        score_ids = getattr(self.backend, "score_ids", None)
+        if score_ids is not None:
+            return score_ids(query_vec, ids)
+        rows = self.session.execute(
+            select(MemoryEmbedding.memory_item_id, MemoryEmbedding.vector, MemoryEmbedding.encoding, MemoryEmbedding.scale)
+            .where(MemoryEmbedding.memory_item_id.in_(ids))
+        ).all()
+        if not rows:
+            return []
+        vecs = decode_blobs([r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows])
+        norms = np.linalg.norm(vecs, axis=1)
+        norms[norms == 0] = 1.0
+        scores = (vecs @ np.asarray(query_vec, dtype=np.float32)) / norms
+        order = np.argsort(-scores, kind="stable")
+        return [(int(rows[i][0]), float(scores[i])) for i in order]
 
-            if emb is None or emb.vector is None:
-                continue
+    def _hydrate(
+        self,
+        hits: list[tuple[int, float]],
+        min_salience: float = 0.0,
+    ) -> list[tuple[MemoryItem, float]]:
+        if not hits:
+            return []
+
+        ids = [item_id for item_id, _ in hits]
+        items = {
+            item.id: item
+            for item in self.session.query(MemoryItem)
+            .filter(MemoryItem.id.in_(ids), MemoryItem.archived_at.is_(None))
+            .all()
+        }
+        # The backend's salience copy can lag the DB (and may still hold rows
+        # archived by `molly memory compact`), so re-check on the fresh rows.
+        return [
+            (items[item_id], score)
+            for item_id, score in hits
+            if item_id in items and items[item_id].salience >= min_salience
+        ]
 
-            v = np.frombuffer(emb.vector, dtype=np.float32)
-            score = cosine_sim(qv, v)
-            scored.append((item, score))
+    def requantize(self, fmt: str, batch_size: int = 1000, after_id: int = 0) -> tuple[int, int]:
+        """
+        Rewrite one batch of memory_embedding rows not yet in `fmt`, in id order
+        starting after `after_id`. Returns (rows converted, last id seen; 0 = done).
+        """
+        rows = self.session.execute(
+            select(MemoryEmbedding.id, MemoryEmbedding.vector, MemoryEmbedding.encoding, MemoryEmbedding.scale)
+            .where(MemoryEmbedding.id > after_id, MemoryEmbedding.encoding != fmt)
+            .order_by(MemoryEmbedding.id.asc())
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return 0, 0
 
-        scored.sort(key=lambda x: x[1], reverse=True)
-        return scored[: max(1, int(top_k))]
+        vecs = decode_blobs([r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows])
+        updates = []
+        for row, vec in zip(rows, vecs):
+            blob, scale = encode_vector(vec, fmt)
+            updates.append({"id": row[0], "vector": blob, "encoding": fmt, "scale": scale})
+        self.session.execute(update(MemoryEmbedding), updates)  # bulk UPDATE by primary key
+        return len(rows), int(rows[-1][0])
 
     def touch_last_used(self, ids: Iterable[int]) -> None:
+        """
+        Set last_used_at = now() for `ids` in one UPDATE. Chat turns don't call
+        this directly; they go through molly.touch_buffer.TouchBuffer.
+        """
         ids = [int(x) for x in ids]
         if not ids:
             return
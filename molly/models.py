@@ -8,6 +8,8 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
+    Integer,
     LargeBinary,
     String,
     Text,
@@ -19,17 +21,10 @@ from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 class Base(DeclarativeBase):
     pass
 
-from __future__ import annotations
-
-from datetime import datetime
-from sqlalchemy import DateTime, Float, ForeignKey, Integer, LargeBinary, String, Text
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-
-# ... keep your existing Base and other models above ...
-
 
 class MemoryItem(Base):
     __tablename__ = "memory_item"
+    __table_args__ = (Index("ix_memory_item_salience_id", "salience", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     kind: Mapped[str] = mapped_column(String(50), nullable=False)  # preference/project/fact/etc
@@ -39,6 +34,9 @@ class MemoryItem(Base):
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     last_used_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Set by `molly memory compact` (decayed below threshold or merged into a
+    # near-duplicate); archived items are left out of search.
+    archived_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     embedding: Mapped["MemoryEmbedding | None"] = relationship(
         "MemoryEmbedding",
@@ -60,8 +58,10 @@ class MemoryEmbedding(Base):
         unique=True,
     )
 
-    # store float32 bytes
+    # raw vector bytes in `encoding` (see molly.vector_codec): f32 | f16 | i8
     vector: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    encoding: Mapped[str] = mapped_column(String(8), nullable=False, default="f32", server_default="f32")
+    scale: Mapped[float | None] = mapped_column(Float, nullable=True)  # int8 only
 
     memory_item: Mapped["MemoryItem"] = relationship(
         "MemoryItem",
@@ -96,6 +96,10 @@ class Conversation(Base):
     summary: Mapped[str | None] = mapped_column(Text, nullable=True)
     summary_updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
+    # Bumped by every message insert (MessageRepo.add); lets in-process tail
+    # caches detect writes from elsewhere.
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, server_default="0")
+
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
 
     messages: Mapped[list["Message"]] = relationship(
@@ -106,6 +110,7 @@ class Conversation(Base):
 
 class Message(Base):
     __tablename__ = "message"
+    __table_args__ = (Index("ix_message_conversation_id_id", "conversation_id", "id"),)
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
 
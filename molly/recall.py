@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from molly.config import Settings
+from molly.session import session_scope
+from molly.touch_buffer import TouchBuffer
+
+
+@dataclass(frozen=True)
+class RecalledMemory:
+    id: int
+    kind: str
+    text: str
+    score: float
+
+    def line(self) -> str:
+        return f"- {self.kind}: {self.text}"
+
+
+class MemoryRecall:
+    """
+    Long-term memory lookup for chat turns.
+
+    `start()` launches the search (embed query + vector search + hydrate) in a
+    worker thread so it overlaps with the user-message insert; `result()` waits
+    for it only until `budget_ms` after start. A search that misses the budget
+    is dropped for this turn (the thread still finishes, warming the embedding
+    model and index), and no new search starts while one is still running late,
+    so a cold model load can't pile up worker threads.
+
+    Hits below `min_salience` or below `min_score` cosine (keyword hits from
+    hybrid search included) are discarded. Their ids go to a TouchBuffer,
+    which writes last_used_at behind the turn in batches.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        session_factory: sessionmaker[Session],
+        read_session_factory: sessionmaker[Session] | None = None,
+    ):
+        cfg = settings.memory
+        self.settings = settings
+        self.sf = session_factory
+        self.read_sf = read_session_factory or session_factory
+        self.top_k = cfg.recall_k
+        self.min_score = cfg.recall_min_score
+        self.min_salience = cfg.recall_min_salience
+        self.budget = cfg.recall_budget_ms / 1000.0
+        self.log = logging.getLogger("molly.recall")
+
+        self.touches = TouchBuffer(settings, session_factory)
+        self._late = 0  # searches that overran the budget and are still running
+        self.hits = 0
+        self.skipped = 0
+        self.timeouts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.top_k > 0
+
+    # ---- DB steps (run in worker threads) ----
+
+    def _search(self, query: str) -> list[RecalledMemory]:
+        from molly.memory_repo import make_memory_repo
+
+        with session_scope(self.read_sf) as s:
+            hits = make_memory_repo(s, self.settings).search(
+                query,
+                top_k=self.top_k,
+                min_salience=self.min_salience,
+                min_score=self.min_score,
+            )
+            return [RecalledMemory(item.id, item.kind, item.text, score) for item, score in hits]
+
+    # ---- public API ----
+
+    def start(self, query: str) -> asyncio.Task[list[RecalledMemory]] | None:
+        if not self.enabled or not query.strip():
+            return None
+        if self._late:
+            self.skipped += 1
+            return None
+        return asyncio.ensure_future(asyncio.to_thread(self._search, query))
+
+    async def result(self, task: asyncio.Task[list[RecalledMemory]] | None, started: float) -> list[RecalledMemory]:
+        """
+        Wait for `task` until the budget (measured from `started`, a
+        time.perf_counter() value) runs out; [] on timeout or failure.
+        """
+        if task is None:
+            return []
+        remaining = self.budget - (time.perf_counter() - started)
+        done, _ = await asyncio.wait({task}, timeout=max(0.0, remaining))
+        if not done:
+            self.timeouts += 1
+            self._late += 1
+            task.add_done_callback(self._late_done)
+            self.log.info("Memory recall skipped: over %.0fms budget", self.budget * 1000)
+            return []
+        try:
+            memories = task.result()
+        except Exception:
+            self.log.exception("Memory recall failed")
+            return []
+
+        if memories:
+            self.hits += len(memories)
+            self.touches.add(m.id for m in memories)
+        self.log.debug("Memory recall: %d hits in %.0fms", len(memories), (time.perf_counter() - started) * 1000)
+        return memories
+
+    def _late_done(self, task: asyncio.Task) -> None:
+        self._late -= 1
+        if not task.cancelled() and task.exception() is not None:
+            self.log.error("Memory recall failed", exc_info=task.exception())
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "hits": self.hits,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+            "late": self._late,
+            "last_used": self.touches.stats(),
+        }
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self.touches.close)  # flushes buffered last_used_at
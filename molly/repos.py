@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+from collections.abc import Iterator
+
+from sqlalchemy import Row, event, select, update
 from sqlalchemy.orm import Session
 
-from molly.models import AppMeta, Conversation, Message, MemoryItem, MemoryEmbedding
+from molly.models import AppMeta, Conversation, Message
 from molly.prompts import DEFAULT_SYSTEM_PROMPT_V1, DEFAULT_PROMPT_VERSION
+from molly.tail_cache import TailCache, TailMessage
 from sqlalchemy.sql import func
-from molly.memory_repo import MemoryRepo
+from molly.memory_repo import MemoryRepo  # re-exported for callers importing from molly.repos
 
 class AppMetaRepo:
     def __init__(self, session: Session):
@@ -40,7 +44,17 @@ class ConversationRepo:
 
     def get(self, convo_id: str) -> Conversation | None:
         return self.session.get(Conversation, convo_id)
-    
+
+    def ids_after(self, last_id: str = "", limit: int = 1000) -> list[str]:
+        """
+        One keyset page of conversation ids (primary key order) after `last_id`.
+        """
+        return list(
+            self.session.execute(
+                select(Conversation.id).where(Conversation.id > last_id).order_by(Conversation.id.asc()).limit(limit)
+            ).scalars()
+        )
+
     def set_prompt(self, convo_id: str, prompt: str, version: int | None = None) -> bool:
         convo = self.session.get(Conversation, convo_id)
         if convo is None:
@@ -67,8 +81,9 @@ class ConversationRepo:
 
 
 class MessageRepo:
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, tails: TailCache | None = None):
         self.session = session
+        self.tails = tails
 
     def tail_for_conversation(self, conversation_id: str, limit: int = 20) -> list[Message]:
         rows = (
@@ -87,62 +102,93 @@ class MessageRepo:
             content=content,
         )
         self.session.add(msg)
+        self._bump_version(conversation_id, TailMessage.of(role, content))
         return msg
 
-    def list_for_conversation(self, conversation_id: str) -> list[Message]:
-        return (
-            self.session.query(Message)
-            .filter(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at.asc())
-            .all()
-        )
-
-from sqlalchemy.orm import joinedload
-from sqlalchemy.sql import func
-import numpy as np
+    def _bump_version(self, conversation_id: str, record: TailMessage) -> None:
+        """
+        Every insert bumps conversation.version so in-process tail caches (ours
+        or another process's) can tell the conversation changed. With a cached
+        tail, the bump is conditional on the version it reflects; on a match the
+        record is appended after commit, otherwise the tail is dropped.
+        """
+        bump = update(Conversation).where(Conversation.id == conversation_id).values(version=Conversation.version + 1)
+
+        # Versions already bumped by this (uncommitted) transaction.
+        pending = self.session.info.setdefault("molly_tail_versions", {})
+        expected = pending.get(conversation_id)
+        if expected is None and self.tails is not None:
+            expected = self.tails.version(conversation_id)
+
+        if expected is not None and self.session.execute(bump.where(Conversation.version == expected)).rowcount == 1:
+            pending[conversation_id] = expected + 1
+            self._tail_after_commit(lambda: self.tails.append(conversation_id, expected, record))
+            return
 
-from molly.embeddings import embed_text, cosine_sim
+        self.session.execute(bump)
+        pending.pop(conversation_id, None)
+        if self.tails is not None:
+            self._tail_after_commit(lambda: self.tails.invalidate(conversation_id))
 
-class MemoryRepo:
-    def __init__(self, session: Session):
-        self.session = session
+    def _tail_after_commit(self, apply) -> None:
+        # Only committed inserts reach the cache; a rollback discards them.
+        queued = self.session.info.get("molly_tail_pending")
+        if queued is None:
+            queued = self.session.info["molly_tail_pending"] = []
 
-    def add_memory(self, kind: str, text: str, salience: float = 1.0) -> MemoryItem:
-        item = MemoryItem(kind=kind, text=text, salience=salience)
-        self.session.add(item)
-        self.session.flush()  # so item.id exists
+            def _on_commit(session: Session) -> None:
+                session.info.pop("molly_tail_versions", None)
+                for fn in session.info.pop("molly_tail_pending", []):
+                    fn()
 
-        vec = embed_text(f"{kind}: {text}")
-        emb = MemoryEmbedding(memory_item_id=item.id, vector=vec.tobytes())
-        self.session.add(emb)
-        return item
+            def _on_rollback(session: Session, _previous_transaction) -> None:
+                session.info.pop("molly_tail_versions", None)
+                session.info.pop("molly_tail_pending", None)
 
-    def search(self, query: str, top_k: int = 5, min_salience: float = 0.1) -> list[tuple[MemoryItem, float]]:
-        qv = embed_text(query)
+            event.listen(self.session, "after_commit", _on_commit, once=True)
+            event.listen(self.session, "after_soft_rollback", _on_rollback, once=True)
+        queued.append(apply)
 
-        rows: list[MemoryItem] = (
-            self.session.query(MemoryItem)
-            .options(joinedload(MemoryItem.embedding))
-            .filter(MemoryItem.salience >= min_salience)
+    def list_for_conversation(self, conversation_id: str) -> list[Message]:
+        # id order is insertion order; created_at has 1s resolution and ties.
+        return (
+            self.session.query(Message)
+            .filter(Message.conversation_id == conversation_id)
+            .order_by(Message.id.asc())
             .all()
         )
 
-        scored: list[tuple[MemoryItem, float]] = []
-        for item in rows:
-            if item.embedding is None:
-                continue
-            v = np.frombuffer(item.embedding.vector, dtype=np.float32)
-            score = cosine_sim(qv, v)
-            scored.append((item, score))
-
-        scored.sort(key=lambda x: x[1], reverse=True)
-        return scored[:top_k]
+    def page(self, conversation_id: str, after_id: int = 0, limit: int = 1000) -> list[Row]:
+        """
+        One keyset page of a conversation's messages (id, role, content,
+        created_at): `WHERE id > after_id ORDER BY id LIMIT n`, served from the
+        (conversation_id, id) index however deep the page is.
+        """
+        return list(
+            self.session.execute(
+                select(Message.id, Message.role, Message.content, Message.created_at)
+                .where(Message.conversation_id == conversation_id, Message.id > after_id)
+                .order_by(Message.id.asc())
+                .limit(limit)
+            ).all()
+        )
 
-    def touch_last_used(self, ids: list[int]) -> None:
-        if not ids:
-            return
-        (
-            self.session.query(MemoryItem)
-            .filter(MemoryItem.id.in_(ids))
-            .update({MemoryItem.last_used_at: func.now()}, synchronize_session=False)
-        )
\ No newline at end of file
+    def iter_for_conversation(
+        self,
+        conversation_id: str,
+        batch_size: int = 1000,
+        after_id: int = 0,
+    ) -> Iterator[Row]:
+        """
+        Stream a conversation's messages (id, role, content, created_at) in id
+        order with keyset pagination (see page()), so memory stays constant and
+        no page rescans earlier rows. Rows are plain tuples, so nothing
+        accumulates in the identity map.
+        """
+        last_id = after_id
+        while True:
+            rows = self.page(conversation_id, after_id=last_id, limit=batch_size)
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1].id
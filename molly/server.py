@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from urllib.parse import parse_qsl, urlsplit
+
+from molly.config import Settings
+from molly.engine import HISTORY_PAGE, ChatEngine, create_chat_engine
+
+_MAX_BODY = 1 << 20  # 1 MiB
+_REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+_CONVO = re.compile(r"^/conversations/([^/]+)$")
+_MESSAGES = re.compile(r"^/conversations/([^/]+)/messages$")
+
+
+class Overloaded(Exception):
+    pass
+
+
+class TurnGate:
+    """
+    Admission control toward the model backend: at most `max_active` turns
+    generate at once, up to `max_queue` more wait for a slot, and anything past
+    that is rejected right away (503) instead of piling up behind the model.
+    """
+
+    def __init__(self, max_active: int, max_queue: int):
+        self._slots = asyncio.Semaphore(max(1, max_active))
+        self.max_queue = max(0, max_queue)
+        self.waiting = 0
+        self.active = 0
+
+    async def __aenter__(self) -> TurnGate:
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                raise Overloaded()
+            self.waiting += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.active += 1
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.active -= 1
+        self._slots.release()
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    headers: dict[str, str] = field(default_factory=dict)
+    query: dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+
+    def json(self) -> dict:
+        if not self.body:
+            return {}
+        data = json.loads(self.body)
+        if not isinstance(data, dict):
+            raise ValueError("JSON body must be an object")
+        return data
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Request | None:
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line") from None
+
+    headers: dict[str, str] = {}
+    while True:
+        raw = await reader.readline()
+        if raw in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = raw.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise HttpError(400, "Malformed Content-Length") from None
+    if length < 0:
+        raise HttpError(400, "Malformed Content-Length")
+    if length > _MAX_BODY:
+        raise HttpError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    return Request(method=method.upper(), path=url.path, headers=headers, query=dict(parse_qsl(url.query)), body=body)
+
+
+def _head(status: int, headers: dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _send_json(writer: asyncio.StreamWriter, status: int, payload: object, keep_alive: bool) -> None:
+    body = json.dumps(payload).encode()
+    writer.write(
+        _head(
+            status,
+            {
+                "Content-Type": "application/json",
+                "Content-Length": str(len(body)),
+                "Connection": "keep-alive" if keep_alive else "close",
+            },
+        )
+        + body
+    )
+    await writer.drain()
+
+
+class ChatServer:
+    """
+    Minimal asyncio HTTP/1.1 front end over one shared ChatEngine (one session
+    factory, one pooled model adapter, one embedding model per process).
+
+        POST /conversations                      -> 201 {"id": ...}
+        GET  /conversations/{id}                 -> {"id", "title", "summary", "created_at"}
+        GET  /conversations/{id}/messages?after=0&limit=100
+             -> {"messages": [...], "next_after": last id}; keyset pages, oldest
+                first, at most 1000 per page; an empty page ends the history
+        POST /conversations/{id}/messages        {"content": "...", "stream": false}
+             -> {"reply": "..."}, or with "stream": true a text/event-stream of
+                data: {"delta": "..."} events ending with data: {"reply": "..."}
+                (or data: {"error": "..."} if the turn fails mid-stream)
+        GET  /health                             -> {"active", "waiting", "db_pool", "memory_recall"}
+
+    Turns are admitted through a TurnGate; a full queue answers 503.
+    """
+
+    def __init__(self, engine: ChatEngine, settings: Settings):
+        self.engine = engine
+        self.cfg = settings.server
+        self.gate = TurnGate(self.cfg.max_concurrency, self.cfg.max_queue)
+        self.log = logging.getLogger("molly.server")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    req = await _read_request(reader)
+                except HttpError as e:
+                    await _send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+                    return
+                if req is None:
+                    return
+
+                keep_alive = req.headers.get("connection", "").lower() != "close"
+                try:
+                    await self.dispatch(req, writer, keep_alive)
+                except HttpError as e:
+                    await _send_json(writer, e.status, {"error": e.message}, keep_alive)
+                except Overloaded:
+                    await _send_json(writer, 503, {"error": "Server busy, retry later"}, keep_alive)
+                except LookupError:
+                    await _send_json(writer, 404, {"error": "Conversation not found"}, keep_alive)
+                except Exception:
+                    self.log.exception("Request failed: %s %s", req.method, req.path)
+                    await _send_json(writer, 500, {"error": "Internal error"}, keep_alive=False)
+                    return
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # client went away
+        finally:
+            writer.close()
+
+    async def dispatch(self, req: Request, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        if req.path == "/health":
+            health = {
+                "active": self.gate.active,
+                "waiting": self.gate.waiting,
+                "db_pool": self.engine.db_stats(),
+                "memory_recall": self.engine.recall.stats(),
+            }
+            await _send_json(writer, 200, health, keep_alive)
+            return
+
+        if req.path == "/conversations":
+            if req.method != "POST":
+                raise HttpError(405, "Use POST")
+            conversation_id = await self.engine.open_conversation()
+            await _send_json(writer, 201, {"id": conversation_id}, keep_alive)
+            return
+
+        m = _CONVO.match(req.path)
+        if m:
+            if req.method != "GET":
+                raise HttpError(405, "Use GET")
+            convo = await self.engine.get_conversation(m.group(1))
+            if convo is None:
+                raise HttpError(404, "Conversation not found")
+            await _send_json(writer, 200, convo, keep_alive)
+            return
+
+        m = _MESSAGES.match(req.path)
+        if m:
+            conversation_id = m.group(1)
+            if req.method == "GET":
+                if await self.engine.get_conversation(conversation_id) is None:
+                    raise HttpError(404, "Conversation not found")
+                try:
+                    after = int(req.query.get("after", "0"))
+                    limit = int(req.query.get("limit", HISTORY_PAGE))
+                except ValueError:
+                    raise HttpError(400, "after and limit must be integers") from None
+                messages = await self.engine.history(conversation_id, after_id=after, limit=limit)
+                page = {"messages": messages, "next_after": messages[-1]["id"] if messages else None}
+                await _send_json(writer, 200, page, keep_alive)
+                return
+            if req.method == "POST":
+                await self.post_message(conversation_id, req, writer, keep_alive)
+                return
+            raise HttpError(405, "Use GET or POST")
+
+        raise HttpError(404, "Not found")
+
+    async def post_message(
+        self,
+        conversation_id: str,
+        req: Request,
+        writer: asyncio.StreamWriter,
+        keep_alive: bool,
+    ) -> None:
+        try:
+            data = req.json()
+        except ValueError:
+            raise HttpError(400, "Body must be a JSON object") from None
+        content = str(data.get("content") or "").strip()
+        if not content:
+            raise HttpError(400, "content is required")
+
+        if await self.engine.open_conversation(conversation_id) is None:
+            raise HttpError(404, "Conversation not found")
+
+        async with self.gate:
+            if not data.get("stream"):
+                reply = await self.engine.turn(conversation_id, content)
+                await _send_json(writer, 200, {"reply": reply}, keep_alive)
+                return
+
+            writer.write(
+                _head(
+                    200,
+                    {
+                        "Content-Type": "text/event-stream",
+                        "Cache-Control": "no-cache",
+                        "Transfer-Encoding": "chunked",
+                        "Connection": "keep-alive" if keep_alive else "close",
+                    },
+                )
+            )
+
+            def send_event(payload: dict) -> None:
+                if writer.is_closing():
+                    return  # client left; the turn still completes and is persisted
+                event = f"data: {json.dumps(payload)}\n\n".encode()
+                writer.write(f"{len(event):X}\r\n".encode() + event + b"\r\n")
+
+            # Headers are out: from here on errors go into the stream as an
+            # event, never as a second HTTP response.
+            try:
+                reply = await self.engine.turn(conversation_id, content, on_delta=lambda d: send_event({"delta": d}))
+            except LookupError:
+                send_event({"error": "Conversation not found"})
+            except Exception:
+                self.log.exception("Streaming turn failed: %s", conversation_id)
+                send_event({"error": "Internal error"})
+            else:
+                send_event({"reply": reply})
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+
+
+async def serve(settings: Settings) -> None:
+    engine = create_chat_engine(settings)
+    server = ChatServer(engine, settings)
+    log = logging.getLogger("molly.server")
+
+    srv = await asyncio.start_server(server.handle_connection, settings.server.host, settings.server.port)
+    log.info(
+        "Serving on http://%s:%d (adapter=%s, max_concurrency=%d, max_queue=%d)",
+        settings.server.host,
+        settings.server.port,
+        engine.adapter.name,
+        settings.server.max_concurrency,
+        settings.server.max_queue,
+    )
+    try:
+        async with srv:
+            await srv.serve_forever()
+    finally:
+        await engine.aclose()
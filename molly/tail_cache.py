@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from molly.context import estimate_tokens
+
+
+class TailMessage(NamedTuple):
+    role: str
+    content: str
+    tokens: int  # estimate_tokens(content), computed once per message
+
+    @classmethod
+    def of(cls, role: str, content: str) -> TailMessage:
+        return cls(role, content, estimate_tokens(content))
+
+
+class ConversationTail:
+    """
+    Ring buffer of a conversation's newest messages plus the conversation.version
+    it reflects. Only valid while the DB version still matches.
+    """
+
+    __slots__ = ("records", "version")
+
+    def __init__(self, records: Iterable[TailMessage], version: int, maxlen: int):
+        self.records: deque[TailMessage] = deque(records, maxlen=maxlen)
+        self.version = version
+
+
+class TailCache:
+    """
+    Per-conversation message tails kept write-through by MessageRepo.add.
+
+    Each message insert bumps conversation.version in the same transaction. A
+    writer holding a cached tail bumps it with `WHERE version = <cached>`; if
+    that matches nobody else has written since, and the new message is appended
+    after commit. Otherwise the tail is dropped and re-seeded from the DB on
+    next use. Bounded to `max_conversations` tails (least recently used evicted).
+    """
+
+    def __init__(self, maxlen: int = 20, max_conversations: int = 1024):
+        self.maxlen = maxlen
+        self.max_conversations = max_conversations
+        self._tails: OrderedDict[str, ConversationTail] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, conversation_id: str) -> int | None:
+        with self._lock:
+            tail = self._tails.get(conversation_id)
+            return None if tail is None else tail.version
+
+    def records(self, conversation_id: str) -> list[TailMessage] | None:
+        """
+        Copy of the cached tail (oldest first), or None if it must be re-read.
+        """
+        with self._lock:
+            tail = self._tails.get(conversation_id)
+            if tail is None:
+                self.misses += 1
+                return None
+            self._tails.move_to_end(conversation_id)
+            self.hits += 1
+            return list(tail.records)
+
+    def seed(self, conversation_id: str, records: Iterable[TailMessage], version: int) -> None:
+        with self._lock:
+            self._tails[conversation_id] = ConversationTail(records, version, self.maxlen)
+            self._tails.move_to_end(conversation_id)
+            while len(self._tails) > self.max_conversations:
+                self._tails.popitem(last=False)
+
+    def append(self, conversation_id: str, expected_version: int, record: TailMessage) -> None:
+        """
+        Apply a committed insert that moved the version from expected -> expected + 1.
+        """
+        with self._lock:
+            tail = self._tails.get(conversation_id)
+            if tail is None:
+                return
+            if tail.version != expected_version:
+                del self._tails[conversation_id]
+                return
+            tail.records.append(record)
+            tail.version = expected_version + 1
+
+    def invalidate(self, conversation_id: str) -> None:
+        with self._lock:
+            self._tails.pop(conversation_id, None)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"conversations": len(self._tails), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Iterable
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from molly.config import Settings
+from molly.session import session_scope
+
+
+class TouchBuffer:
+    """
+    Write-behind buffer for memory_item.last_used_at.
+
+    add() only records ids in process (a set, so repeated hits on a hot memory
+    cost nothing). A daemon thread flushes every MOLLY_MEMORY_TOUCH_FLUSH_SECONDS,
+    or as soon as MOLLY_MEMORY_TOUCH_MAX_PENDING distinct ids are waiting, with
+    one `UPDATE memory_item SET last_used_at = now() WHERE id IN (...)` in its
+    own short transaction, so searches never write or wait on row locks.
+    last_used_at can therefore lag by up to one flush interval. close() stops
+    the thread and flushes whatever is left; a failed flush keeps its ids for
+    the next attempt. Ids added after close() are dropped (and counted).
+    """
+
+    def __init__(self, settings: Settings, session_factory: sessionmaker[Session]):
+        self.settings = settings
+        self.sf = session_factory
+        self.flush_seconds = max(0.1, settings.memory.touch_flush_seconds)
+        self.max_pending = max(1, settings.memory.touch_max_pending)
+        self.log = logging.getLogger("molly.touch_buffer")
+
+        self._pending: set[int] = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one UPDATE at a time
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread: threading.Thread | None = None
+
+        self.touched = 0  # ids passed to add(), before dedup
+        self.flushed = 0  # rows updated
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0  # ids added after close(), never written
+
+    def add(self, ids: Iterable[int]) -> None:
+        ids = [int(x) for x in ids]
+        if not ids:
+            return
+        with self._lock:
+            if self._closed:
+                # A turn still finishing during shutdown; last_used_at is only a hint.
+                self.dropped += len(ids)
+                self.log.info("TouchBuffer closed; dropped %d last_used_at ids", len(ids))
+                return
+            self._pending.update(ids)
+            self.touched += len(ids)
+            full = len(self._pending) >= self.max_pending
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="molly-touch-flush", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """
+        Write all pending ids now. Returns how many were flushed.
+        """
+        from molly.memory_repo import make_memory_repo
+
+        with self._flush_lock:
+            with self._lock:
+                ids, self._pending = self._pending, set()
+            if not ids:
+                return 0
+            try:
+                with session_scope(self.sf) as s:
+                    make_memory_repo(s, self.settings).touch_last_used(sorted(ids))
+            except Exception:
+                with self._lock:
+                    self._pending |= ids
+                    self.failures += 1
+                raise
+            with self._lock:
+                self.flushed += len(ids)
+                self.flushes += 1
+            return len(ids)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            with self._lock:
+                closed = self._closed
+            if closed:
+                return
+            try:
+                self.flush()
+            except Exception:
+                self.log.exception("Flushing last_used_at failed; will retry")
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._wake.set()
+            thread.join()
+        try:
+            self.flush()
+        except Exception:
+            # Shutdown must finish: last_used_at is a hint, so losing the tail is acceptable.
+            self.log.exception("Final last_used_at flush failed; %d ids not written", len(self._pending))
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "touched": self.touched,
+                "flushed": self.flushed,
+                "flushes": self.flushes,
+                "failures": self.failures,
+                "dropped": self.dropped,
+            }
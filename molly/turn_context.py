@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql import Select
+from sqlalchemy.sql import func
+
+from molly.models import Conversation, Message
+from molly.repos import ConversationRepo, MessageRepo
+from molly.session import session_scope
+from molly.tail_cache import TailCache, TailMessage
+
+
+def context_load_stmt(conversation_id: str, tail_limit: int) -> Select:
+    """
+    Conversation row + version + newest `tail_limit` messages in one query
+    (one row per message, unordered; message columns are NULL for an empty
+    conversation).
+    """
+    tail = (
+        select(Message.id, Message.role, Message.content, Message.conversation_id)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.id.desc())
+        .limit(tail_limit)
+        .subquery()
+    )
+    return (
+        select(
+            Conversation.system_prompt,
+            Conversation.title,
+            Conversation.summary,
+            Conversation.version,
+            tail.c.id,
+            tail.c.role,
+            tail.c.content,
+        )
+        .outerjoin(tail, tail.c.conversation_id == Conversation.id)
+        .where(Conversation.id == conversation_id)
+    )
+
+
+def _row_id(row) -> int:
+    return row.id or 0
+
+
+@dataclass
+class ConversationState:
+    """
+    In-process copy of the conversation columns a turn needs. Kept current by
+    write-through (set_title / set_summary), so turns don't re-read the row.
+    """
+
+    id: str
+    system_prompt: str
+    title: str | None = None
+    summary: str | None = None
+
+
+@dataclass
+class TurnContext:
+    state: ConversationState
+    tail: list[TailMessage] = field(default_factory=list)  # oldest first
+
+    def lines(self, limit: int) -> list[str]:
+        return [f"{m.role}: {m.content}" for m in self.tail[-limit:]]
+
+
+class TurnContextService:
+    """
+    Assembles per-turn context without re-reading what this process wrote:
+
+      begin_turn   INSERT user message + version bump + COMMIT
+      finish_turn  INSERT assistant message + version bump + COMMIT
+
+    The message tail lives in a TailCache, seeded once from the DB when the
+    conversation is opened and kept write-through by MessageRepo.add. If
+    another writer touched the conversation (version mismatch), the tail is
+    re-read with one SELECT. The tail is also handed on to title/summary jobs
+    (see molly.jobs) rather than queried again. At most `max_conversations`
+    states and tails are kept (least recently used evicted, then re-read on
+    next use).
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker[Session],
+        tail_limit: int = 20,
+        read_session_factory: sessionmaker[Session] | None = None,
+        max_conversations: int = 1024,
+    ):
+        self.sf = session_factory
+        self.read_sf = read_session_factory or session_factory
+        self.tail_limit = tail_limit
+        self.max_conversations = max_conversations
+        self.tails = TailCache(maxlen=tail_limit, max_conversations=max_conversations)
+        self._states: OrderedDict[str, ConversationState] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached(self, conversation_id: str) -> ConversationState | None:
+        with self._lock:
+            state = self._states.get(conversation_id)
+            if state is not None:
+                self._states.move_to_end(conversation_id)
+            return state
+
+    def _remember(self, state: ConversationState) -> None:
+        with self._lock:
+            self._states[state.id] = state
+            self._states.move_to_end(state.id)
+            while len(self._states) > self.max_conversations:
+                self._states.popitem(last=False)
+
+    def open(self, conversation_id: str | None = None) -> ConversationState | None:
+        """
+        Create a conversation (no id) or load an existing one; None if not found.
+        """
+        if conversation_id is None:
+            with session_scope(self.sf) as s:
+                convo = ConversationRepo(s).create(title=None)
+                state = ConversationState(convo.id, convo.system_prompt, convo.title, convo.summary)
+            self._remember(state)
+            self.tails.seed(state.id, [], version=0)
+            return state
+
+        return self.cached(conversation_id) or self._load(conversation_id)
+
+    def _load(self, conversation_id: str) -> ConversationState | None:
+        stmt = context_load_stmt(conversation_id, self.tail_limit)
+        with session_scope(self.read_sf) as s:
+            rows = s.execute(stmt).all()
+        if not rows:
+            return None
+
+        system_prompt, title, summary, version = rows[0][:4]
+        state = ConversationState(conversation_id, system_prompt, title, summary)
+        self._remember(state)
+        self.tails.seed(
+            conversation_id,
+            [TailMessage.of(r.role, r.content) for r in sorted(rows, key=_row_id) if r.id is not None],
+            version=version,
+        )
+        return state
+
+    def begin_turn(self, conversation_id: str, user_text: str) -> TurnContext | None:
+        """
+        Persist the user's message and return the conversation state plus the
+        message tail (ending with that message). None if the conversation is gone.
+        """
+        state = self.open(conversation_id)
+        if state is None:
+            return None
+        with session_scope(self.sf) as s:
+            MessageRepo(s, self.tails).add(conversation_id=conversation_id, role="user", content=user_text)
+
+        records = self.tails.records(conversation_id)
+        if records is None:
+            # Someone else wrote to the conversation (or its tail was evicted):
+            # re-seed (includes our message).
+            state = self._load(conversation_id)
+            if state is None:
+                return None
+            records = self.tails.records(conversation_id) or []
+        return TurnContext(state=state, tail=records)
+
+    def finish_turn(self, ctx: TurnContext, assistant_text: str) -> None:
+        with session_scope(self.sf) as s:
+            MessageRepo(s, self.tails).add(conversation_id=ctx.state.id, role="assistant", content=assistant_text)
+        ctx.tail.append(TailMessage.of("assistant", assistant_text))
+
+    def set_title(self, conversation_id: str, title: str) -> None:
+        with session_scope(self.sf) as s:
+            s.execute(update(Conversation).where(Conversation.id == conversation_id).values(title=title))
+        state = self.cached(conversation_id)
+        if state is not None:
+            state.title = title
+
+    def set_summary(self, conversation_id: str, summary: str) -> None:
+        with session_scope(self.sf) as s:
+            s.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id)
+                .values(summary=summary, summary_updated_at=func.now())
+            )
+        state = self.cached(conversation_id)
+        if state is not None:
+            state.summary = summary
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import numpy as np
+
+# memory_embedding.encoding values
+F32 = "f32"  # raw float32 (1536 bytes for 384 dims)
+F16 = "f16"  # float16 (768 bytes)
+I8 = "i8"  # int8 scalar quantized with a per-vector scale (384 bytes)
+
+FORMATS = (F32, F16, I8)
+
+_DTYPES = {F32: np.float32, F16: np.float16, I8: np.int8}
+
+
+def storage_dtype(fmt: str) -> np.dtype:
+    try:
+        return np.dtype(_DTYPES[fmt])
+    except KeyError:
+        raise ValueError(f"Unknown vector format: {fmt}") from None
+
+
+def quantize(vectors: np.ndarray, fmt: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (n, dim) float32 -> (codes in the storage dtype, per-row float32 scales).
+    Float formats have scale 1.0; int8 uses symmetric max-abs scaling per row.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = vectors.shape[0]
+    if fmt == I8:
+        scales = np.abs(vectors).max(axis=1) / 127.0 if vectors.size else np.empty(0, dtype=np.float32)
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+    return vectors.astype(storage_dtype(fmt)), np.ones(n, dtype=np.float32)
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    out = np.asarray(codes).astype(np.float32)
+    if codes.dtype == np.int8:
+        out *= np.asarray(scales, dtype=np.float32).reshape(-1, 1)
+    return out
+
+
+def encode_vector(vec: np.ndarray, fmt: str) -> tuple[bytes, float | None]:
+    """
+    One vector -> (BLOB, scale) for memory_embedding.vector / .scale.
+    """
+    codes, scales = quantize(np.asarray(vec, dtype=np.float32).reshape(1, -1), fmt)
+    return codes.tobytes(), (float(scales[0]) if fmt == I8 else None)
+
+
+def decode_blobs(blobs: list[bytes], encodings: list[str], scales: list[float | None]) -> np.ndarray:
+    """
+    Mixed-format BLOBs -> (n, dim) float32. Rows sharing an encoding are decoded
+    with one frombuffer call.
+    """
+    n = len(blobs)
+    groups: dict[str, list[int]] = {}
+    for i, enc in enumerate(encodings):
+        groups.setdefault(enc or F32, []).append(i)
+
+    out: np.ndarray | None = None
+    for enc, rows in groups.items():
+        codes = np.frombuffer(b"".join(blobs[i] for i in rows), dtype=storage_dtype(enc)).reshape(len(rows), -1)
+        row_scales = np.array([scales[i] or 1.0 for i in rows], dtype=np.float32)
+        vecs = dequantize(codes, row_scales)
+        if out is None:
+            out = np.empty((n, vecs.shape[1]), dtype=np.float32)
+        out[rows] = vecs
+    return out if out is not None else np.empty((0, 0), dtype=np.float32)
+
+
+def score_codes(
+    codes: np.ndarray,
+    scales: np.ndarray,
+    query: np.ndarray,
+    block_rows: int = 16384,
+) -> np.ndarray:
+    """
+    codes @ query for any storage dtype. Compact rows are upcast one block at a
+    time, so the float32 copy never exceeds block_rows x dim.
+    """
+    if codes.dtype == np.float32:
+        return codes @ query
+
+    out = np.empty(codes.shape[0], dtype=np.float32)
+    for start in range(0, codes.shape[0], block_rows):
+        block = codes[start : start + block_rows]
+        out[start : start + block.shape[0]] = block.astype(np.float32) @ query
+    if codes.dtype == np.int8:
+        out *= scales
+    return out
@@ -3,19 +3,36 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any
 
+import numpy as np
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
+from qdrant_client.http.models import (
+    Distance,
+    FieldCondition,
+    Filter,
+    PointIdsList,
+    PointStruct,
+    Range,
+    VectorParams,
+)
+from sqlalchemy.orm import Session
+
+from molly.memory_index import decode_embedding_rows, embedding_rows_stmt
+from molly.models import AppMeta, MemoryEmbedding
+
+IN_MEMORY = ":memory:"
 
 
 @dataclass(frozen=True)
 class QdrantSettings:
-    url: str = "http://127.0.0.1:6333"
+    url: str = "http://127.0.0.1:6333"  # ":memory:" = local in-process mode (tests)
     collection: str = "molly_memories"
     vector_size: int = 384  # all-MiniLM-L6-v2
     distance: Distance = Distance.COSINE
 
 
 def get_qdrant_client(cfg: QdrantSettings) -> QdrantClient:
+    if cfg.url == IN_MEMORY:
+        return QdrantClient(location=IN_MEMORY)
     return QdrantClient(url=cfg.url)
 
 
@@ -27,4 +44,112 @@ def ensure_collection(client: QdrantClient, cfg: QdrantSettings) -> None:
     client.create_collection(
         collection_name=cfg.collection,
         vectors_config=VectorParams(size=cfg.vector_size, distance=cfg.distance),
-    )
\ No newline at end of file
+    )
+
+
+class QdrantMemoryBackend:
+    """
+    Memory search through a Qdrant collection (point id = memory_item.id,
+    payload = {"salience": ...}).
+
+    MariaDB stays the source of truth: points are upserted after the insert
+    commits, and refresh() backfills any memory_embedding rows above a watermark
+    kept in app_meta, so rows written elsewhere (or before Qdrant was enabled)
+    converge without a full re-upload on every start.
+    """
+
+    name = "qdrant"
+
+    def __init__(self, client: QdrantClient, cfg: QdrantSettings, batch_size: int = 512):
+        self.client = client
+        self.cfg = cfg
+        self.batch_size = batch_size
+        self.watermark: int | None = None
+        ensure_collection(client, cfg)
+
+    @property
+    def _meta_key(self) -> str:
+        return f"qdrant_watermark:{self.cfg.collection}"
+
+    @property
+    def _persist_watermark(self) -> bool:
+        # An in-memory collection starts empty every process, so its watermark must too.
+        return self.cfg.url != IN_MEMORY
+
+    def add_many(self, ids: np.ndarray, vectors: np.ndarray, salience: np.ndarray) -> int:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        points = [
+            PointStruct(id=int(item_id), vector=vec.tolist(), payload={"salience": float(sal)})
+            for item_id, vec, sal in zip(ids, vectors, salience)
+        ]
+        if not points:
+            return 0
+        self.client.upsert(collection_name=self.cfg.collection, points=points, wait=True)
+        return len(points)
+
+    def add(self, item_id: int, vector: np.ndarray, salience: float) -> bool:
+        return self.add_many([item_id], np.asarray(vector).reshape(1, -1), [salience]) == 1
+
+    def refresh(self, session: Session) -> int:
+        if self.watermark is None:
+            row = session.get(AppMeta, self._meta_key) if self._persist_watermark else None
+            self.watermark = 0 if row is None else int(row.value)
+
+        added = 0
+        while True:
+            rows = session.execute(
+                embedding_rows_stmt()
+                .where(MemoryEmbedding.id > self.watermark)
+                .order_by(MemoryEmbedding.id.asc())
+                .limit(self.batch_size)
+            ).all()
+            if not rows:
+                break
+            added += self.add_many(*decode_embedding_rows(rows))
+            self.watermark = int(rows[-1][0])
+
+        if added and self._persist_watermark:
+            row = session.get(AppMeta, self._meta_key)
+            if row is None:
+                session.add(AppMeta(key=self._meta_key, value=str(self.watermark)))
+            else:
+                row.value = str(self.watermark)
+        return added
+
+    def remove(self, ids) -> int:
+        points = [int(x) for x in ids]
+        if not points:
+            return 0
+        self.client.delete(
+            collection_name=self.cfg.collection,
+            points_selector=PointIdsList(points=points),
+            wait=True,
+        )
+        return len(points)
+
+    def invalidate(self) -> None:
+        """
+        Force the next refresh() to re-upsert every row (upserts are idempotent).
+        """
+        self.watermark = 0
+
+    def search(
+        self,
+        query_vec: np.ndarray,
+        top_k: int = 5,
+        min_salience: float = 0.0,
+    ) -> list[tuple[int, float]]:
+        query_filter: Any = None
+        if min_salience > 0.0:
+            query_filter = Filter(
+                must=[FieldCondition(key="salience", range=Range(gte=float(min_salience)))]
+            )
+
+        res = self.client.query_points(
+            collection_name=self.cfg.collection,
+            query=np.asarray(query_vec, dtype=np.float32).tolist(),
+            query_filter=query_filter,
+            limit=int(top_k),
+            with_payload=False,
+        )
+        return [(int(p.id), float(p.score)) for p in res.points]